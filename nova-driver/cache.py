@@ -0,0 +1,80 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (c) 2013 dotCloud, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import time
+
+
+class LRUCache(object):
+    """Size-bounded mapping which evicts its least recently used entries.
+
+    Entries put with a `ttl` expire after that many seconds. Lookups are
+    counted in the `hits` and `misses` attributes.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        entry = self._data.get(key)
+        return entry is not None and not self._expired(entry)
+
+    def _expired(self, entry):
+        expires = entry[1]
+        return expires is not None and time.time() >= expires
+
+    def get(self, key, default=None):
+        try:
+            entry = self._data.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        if self._expired(entry):
+            self.misses += 1
+            return default
+        self._data[key] = entry
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, value, ttl=None):
+        if self.max_size <= 0:
+            return
+        expires = None
+        if ttl is not None:
+            expires = time.time() + ttl
+        self._data.pop(key, None)
+        self._data[key] = (value, expires)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return default
+        return entry[0]
+
+    def items(self):
+        return [(key, entry[0]) for key, entry in self._data.items()]
+
+    def clear(self):
+        self._data.clear()
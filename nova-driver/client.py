@@ -15,57 +15,351 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import functools
+import json
+import select
 import socket
+import time
+import urllib
 
+import eventlet
+from eventlet import event
 from eventlet.green import httplib
+from eventlet import greenpool
+from eventlet import queue
+from eventlet import semaphore
+from oslo.config import cfg
 
+from nova import exception
+from nova.openstack.common import excutils
+from nova.openstack.common.gettextutils import _
 from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
+from nova.virt.docker import cache
+from nova.virt.docker import metrics
+from nova.virt.docker import progress
+from nova.virt.docker import retry
+from nova.virt.docker import scheduler
 
 
+docker_client_opts = [
+    cfg.IntOpt('docker_pool_max_size',
+               default=10,
+               help=_('Maximum number of connections to the docker daemon '
+                      'kept open or in use at the same time')),
+    cfg.IntOpt('docker_pool_idle_timeout',
+               default=60,
+               help=_('Number of seconds an idle connection to the docker '
+                      'daemon is kept in the pool before being closed')),
+    cfg.IntOpt('docker_list_page_size',
+               default=50,
+               help=_('Number of containers fetched per request when '
+                      'listing the containers')),
+    cfg.IntOpt('docker_inspect_concurrency',
+               default=8,
+               help=_('Maximum number of containers inspected at the same '
+                      'time by batch inspections')),
+    cfg.StrOpt('docker_api_version',
+               default='auto',
+               help=_('Version of the docker remote API to use, "auto" '
+                      'negotiates the newest version supported by both the '
+                      'daemon and the driver')),
+    cfg.IntOpt('docker_response_cache_size',
+               default=0,
+               help=_('Maximum number of docker daemon responses cached by '
+                      'the client, 0 disables the cache')),
+    cfg.DictOpt('docker_response_cache_ttls',
+                default={'containers': '2',
+                         'inspect_container': '2',
+                         'images': '10',
+                         'inspect_image': '60'},
+                help=_('Number of seconds the responses of each endpoint '
+                       '(containers, inspect_container, images, '
+                       'inspect_image) are cached. Endpoints not listed are '
+                       'not cached')),
+    cfg.IntOpt('docker_transfer_stall_timeout',
+               default=0,
+               help=_('Number of seconds without any progress after which '
+                      'an image pull or push is aborted, 0 disables it')),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(docker_client_opts)
+
 LOG = logging.getLogger(__name__)
 
+_MISSING = object()
+
+MIN_API_VERSION = (1, 4)
+MAX_API_VERSION = (1, 14)
+
+# NOTE: API features, named by the version introducing them
+CONTAINERS_JSON = (1, 6)
+NAMED_CONTAINERS = (1, 6)
+STATUS_FILTER = (1, 14)
+
+
+def parse_api_version(version):
+    """Parses an API version string such as "1.6" into a tuple."""
+    return tuple(int(part) for part in version.split('.'))
+
+
+def _lower(key):
+    if isinstance(key, basestring):
+        return key.lower()
+    return key
+
+
+class CaseInsensitiveDict(dict):
+    """dict storing its string keys lowercased, they can be looked up with
+       any case. Docker changed the case of some keys between versions.
+    """
+
+    def __init__(self, pairs=(), **kwargs):
+        super(CaseInsensitiveDict, self).__init__()
+        self.update(pairs, **kwargs)
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        """Builds the dict from (key, value) pairs of string keys, this is
+           the object_pairs_hook of the JSON decoder.
+        """
+        obj = cls()
+        dict.update(obj, ((k.lower(), v) for k, v in pairs))
+        return obj
+
+    def __getitem__(self, key):
+        return super(CaseInsensitiveDict, self).__getitem__(_lower(key))
+
+    def __setitem__(self, key, value):
+        super(CaseInsensitiveDict, self).__setitem__(_lower(key), value)
+
+    def __delitem__(self, key):
+        super(CaseInsensitiveDict, self).__delitem__(_lower(key))
+
+    def __contains__(self, key):
+        return super(CaseInsensitiveDict, self).__contains__(_lower(key))
+
+    has_key = __contains__
+
+    def get(self, key, default=None):
+        return super(CaseInsensitiveDict, self).get(_lower(key), default)
+
+    def pop(self, key, *args):
+        return super(CaseInsensitiveDict, self).pop(_lower(key), *args)
+
+    def setdefault(self, key, default=None):
+        return super(CaseInsensitiveDict, self).setdefault(_lower(key),
+                                                           default)
+
+    def update(self, pairs=(), **kwargs):
+        if hasattr(pairs, 'keys'):
+            pairs = ((k, pairs[k]) for k in pairs.keys())
+        for k, v in pairs:
+            self[k] = v
+        for k, v in kwargs.iteritems():
+            self[k] = v
+
+    def copy(self):
+        return CaseInsensitiveDict(self)
+
+
+def _normalize(obj):
+    if isinstance(obj, CaseInsensitiveDict):
+        # NOTE: Built by the JSON decoder, its values already are
+        return obj
+    if isinstance(obj, list):
+        return [_normalize(o) for o in obj]
+    if isinstance(obj, dict):
+        return CaseInsensitiveDict((k, _normalize(v))
+                                   for k, v in obj.iteritems())
+    return obj
+
+
+def loads(data):
+    """Decodes a JSON document, its objects into CaseInsensitiveDicts."""
+    return json.loads(data, object_pairs_hook=CaseInsensitiveDict.from_pairs)
+
 
 def filter_data(f):
     """Decorator that post-processes data returned by Docker to avoid any
-       surprises with different versions of Docker
+       surprises with different versions of Docker: dicts are turned into
+       CaseInsensitiveDicts.
     """
     @functools.wraps(f)
     def wrapper(*args, **kwds):
-        out = f(*args, **kwds)
-
-        def _filter(obj):
-            if isinstance(obj, list):
-                new_list = []
-                for o in obj:
-                    new_list.append(_filter(o))
-                obj = new_list
-            if isinstance(obj, dict):
-                for k, v in obj.items():
-                    if isinstance(k, basestring):
-                        obj[k.lower()] = _filter(v)
-            return obj
-        return _filter(out)
+        return _normalize(f(*args, **kwds))
     return wrapper
 
 
+def _split_repository_tag(name):
+    """Splits "repository[:tag]", the repository may contain a registry
+       host:port.
+    """
+    repository, sep, tag = name.rpartition(':')
+    if not sep or '/' in tag:
+        return name, None
+    return repository, tag
+
+
+class SingleFlight(object):
+    """Runs a call only once for all the green threads asking for the same
+       key at the same time, they all get its result or its exception.
+
+    The number of callers which waited on another one's call is counted in
+    the `coalesced` attribute.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.coalesced = 0
+
+    def do(self, key, func, *args, **kwargs):
+        waiter = self._calls.get(key)
+        if waiter is not None:
+            self.coalesced += 1
+            return waiter.wait()
+        waiter = event.Event()
+        self._calls[key] = waiter
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            with excutils.save_and_reraise_exception():
+                self._detach(key, waiter)
+                waiter.send_exception(e)
+        self._detach(key, waiter)
+        waiter.send(result)
+        return result
+
+    def _detach(self, key, waiter):
+        if self._calls.get(key) is waiter:
+            del self._calls[key]
+
+    def forget(self, match):
+        """Lets the next callers of the keys for which match(key) is true
+           run their own call instead of waiting for the one in flight.
+        """
+        for key in [key for key in self._calls if match(key)]:
+            del self._calls[key]
+
+
+def _read_stream_chunk(response, size):
+    """Reads what the daemon flushed so far on a streamed response, without
+       blocking until `size` bytes are available.
+    """
+    if not getattr(response, 'chunked', False):
+        # NOTE: The daemon chunks the streams it flushes (events, progress).
+        # Other bodies have a length or are raw streams read to the end,
+        # like the output of an attach, a full read is not delayed.
+        return response.read(size)
+    data = response.read(1)
+    if data:
+        # NOTE: httplib now knows how much is left in the current chunk
+        left = response.chunk_left
+        if left:
+            data += response.read(min(left, size - 1))
+    return data
+
+
+def _iter_json_stream(response, size=4096):
+    """Yields the JSON objects of a streamed response as they arrive. Docker
+       concatenates them without any separator.
+    """
+    decoder = json.JSONDecoder()
+    buf = ''
+    while True:
+        data = _read_stream_chunk(response, size)
+        if not data:
+            break
+        buf += data
+        while True:
+            buf = buf.lstrip()
+            if not buf:
+                break
+            try:
+                obj, end = decoder.raw_decode(buf)
+            except ValueError:
+                # NOTE: Incomplete object, wait for the rest of it
+                break
+            buf = buf[end:]
+            yield obj
+
+
 class Response(object):
-    def __init__(self, http_response, skip_body=False):
+    """Response of the docker daemon.
+
+    The body is decoded on the first access to `json` only. With skip_body
+    it is not read at all: it is left to `read` or `iter_chunks`, and `data`
+    and `json` are None. `on_close` is called with the number of bytes read
+    from a streamed body when it is closed.
+    """
+
+    def __init__(self, http_response, skip_body=False, release=None):
         self._response = http_response
+        self._release = release
+        self.on_close = None
+        self.bytes_read = 0
+        self._decoded = skip_body
+        self._json = None
         self.code = int(http_response.status)
-        self.data = http_response.read()
-        self.json = self._decode_json(self.data)
+        self.data = None
+        if not skip_body:
+            # NOTE: The body has to be read before the connection goes back
+            # to the pool.
+            self.data = http_response.read()
+
+    @property
+    def json(self):
+        if not self._decoded:
+            self._json = self._decode_json(self.data)
+            self._decoded = True
+        return self._json
+
+    @property
+    def will_close(self):
+        return self._response.will_close
+
+    @property
+    def chunked(self):
+        return getattr(self._response, 'chunked', False)
+
+    @property
+    def chunk_left(self):
+        return self._response.chunk_left
 
     def read(self, size=None):
-        return self._response.read(size)
+        data = self._response.read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def iter_chunks(self, size=65536):
+        """Yields a streamed body as it arrives, then closes the
+           response.
+        """
+        try:
+            while True:
+                chunk = _read_stream_chunk(self, size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self):
+        """Releases the connection of a streamed response."""
+        on_close, self.on_close = self.on_close, None
+        if on_close is not None:
+            on_close(self.bytes_read)
+        release, self._release = self._release, None
+        if release is not None:
+            release()
 
-    @filter_data
     def _decode_json(self, data):
         if self._response.getheader('Content-Type') != 'application/json':
             return
         try:
-            return jsonutils.loads(self.data)
+            return loads(data)
         except ValueError:
             return
 
@@ -81,35 +375,437 @@ class UnixHTTPConnection(httplib.HTTPConnection):
         self.sock = sock
 
 
+class UnixHTTPConnectionPool(object):
+    """Bounded pool of keep-alive connections to the docker daemon.
+
+    At most `max_size` connections are handed out at the same time, callers
+    block (cooperatively) until one is released. Idle connections are closed
+    after `idle_timeout` seconds or as soon as the daemon hangs up on them.
+    """
+
+    def __init__(self, max_size=None, idle_timeout=None):
+        if max_size is None:
+            max_size = CONF.docker_pool_max_size
+        if idle_timeout is None:
+            idle_timeout = CONF.docker_pool_idle_timeout
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._idle = collections.deque()
+        self._slots = semaphore.Semaphore(max_size)
+
+    def _create(self):
+        return UnixHTTPConnection()
+
+    def _is_usable(self, conn, last_used):
+        if time.time() - last_used > self.idle_timeout:
+            return False
+        if conn.sock is None:
+            # NOTE: httplib reconnects transparently on the next request
+            return True
+        try:
+            # NOTE: An idle keep-alive socket must not have anything to read,
+            # readability means the daemon closed it (or sent garbage).
+            readable, _w, _x = select.select([conn.sock], [], [], 0)
+        except (socket.error, select.error, ValueError):
+            return False
+        return not readable
+
+    def _evict_expired(self):
+        now = time.time()
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            conn, _last_used = self._idle.popleft()
+            conn.close()
+
+    def get(self):
+        self._slots.acquire()
+        self._evict_expired()
+        while self._idle:
+            conn, last_used = self._idle.pop()
+            if self._is_usable(conn, last_used):
+                return conn
+            conn.close()
+        return self._create()
+
+    def put(self, conn, discard=False):
+        try:
+            if discard:
+                conn.close()
+            else:
+                self._idle.append((conn, time.time()))
+                self._evict_expired()
+        finally:
+            self._slots.release()
+
+    def close(self):
+        while self._idle:
+            conn, _last_used = self._idle.pop()
+            conn.close()
+
+
 class DockerHTTPClient(object):
     def __init__(self, connection=None):
         self._connection = connection
+        self._pool = None
+        self._pulls = SingleFlight()
+        self._gets = SingleFlight()
+        self.scheduler = scheduler.RequestScheduler(CONF.docker_pool_max_size)
+        self.breaker = retry.CircuitBreaker(self._probe)
+        self.metrics = metrics.Metrics()
+        self._api_version = None
+        self._cache = None
+        self._cache_ttls = {}
+        # NOTE: Bumped by every invalidation, a result fetched while its
+        # endpoint was invalidated may already be stale and is not cached.
+        self._cache_generations = collections.Counter()
+        self._cache_clears = 0
+        if CONF.docker_response_cache_size > 0:
+            self._cache = cache.LRUCache(CONF.docker_response_cache_size)
+            self._cache_ttls = dict(
+                (endpoint, int(ttl)) for endpoint, ttl
+                in CONF.docker_response_cache_ttls.iteritems())
 
     @property
-    def connection(self):
-        if self._connection:
-            return self._connection
-        else:
-            return UnixHTTPConnection()
+    def pool(self):
+        if self._pool is None:
+            self._pool = UnixHTTPConnectionPool()
+        return self._pool
+
+    def stats(self):
+        """Returns a snapshot of the request metrics per endpoint along with
+           the counters of the client.
+        """
+        return {
+            'endpoints': self.metrics.snapshot(),
+            'cache': self.cache_stats,
+            'scheduler': dict((priority, dict(stats)) for priority, stats
+                              in self.scheduler.stats.iteritems()),
+            'coalesced_requests': self.coalesced_requests,
+            'coalesced_pulls': self.coalesced_pulls,
+            'daemon_unavailable': self.breaker.is_open,
+        }
+
+    @property
+    def cache_stats(self):
+        if self._cache is None:
+            return {'hits': 0, 'misses': 0, 'size': 0}
+        return {'hits': self._cache.hits, 'misses': self._cache.misses,
+                'size': len(self._cache)}
+
+    def _cached(self, endpoint, key, fetch):
+        """Returns the cached result of `endpoint` for `key`, calls `fetch`
+           on a miss. None results are not cached. Callers must not modify
+           the results.
+        """
+        ttl = self._cache_ttls.get(endpoint)
+        if self._cache is None or not ttl:
+            return fetch()
+        value = self._cache.get((endpoint, key), _MISSING)
+        if value is not _MISSING:
+            return value
+        generation = self._cache_generation(endpoint)
+        value = fetch()
+        if value is not None and \
+                self._cache_generation(endpoint) == generation:
+            self._cache.put((endpoint, key), value, ttl=ttl)
+        return value
+
+    def _cache_generation(self, endpoint):
+        return self._cache_clears, self._cache_generations[endpoint]
+
+    def _invalidate(self, endpoints, match=None):
+        """Drops the cached results of `endpoints`, only those for which
+           match(key, value) is true if given.
+        """
+        if self._cache is None:
+            return
+        for endpoint in endpoints:
+            self._cache_generations[endpoint] += 1
+        for (endpoint, key), value in self._cache.items():
+            if endpoint in endpoints and (match is None or
+                                          match(key, value)):
+                self._cache.pop((endpoint, key))
+
+    def _forget_gets(self, resource):
+        # NOTE: A caller coming after a change must not share the response
+        # of a GET sent before it. Keys start with the versioned URL.
+        prefix = '/{0}/'.format(resource)
+        self._gets.forget(
+            lambda key: key[0][key[0].find('/', 1):].startswith(prefix))
+
+    def _invalidate_container(self, container_id):
+        self._forget_gets('containers')
+
+        def _match(key, value):
+            return (key == container_id or
+                    (value.get('id') or '').startswith(container_id) or
+                    container_id.startswith(key))
+
+        self._invalidate(('containers',))
+        self._invalidate(('inspect_container',), _match)
+
+    def _invalidate_images(self):
+        self._forget_gets('images')
+        self._invalidate(('images', 'inspect_image'))
+
+    def clear_cache(self):
+        if self._cache is not None:
+            self._cache_clears += 1
+            self._cache.clear()
+
+    def handle_event(self, event):
+        """Drops the cached results a docker event made stale."""
+        if event.get('status') in ('pull', 'push', 'tag', 'untag', 'delete',
+                                   'import'):
+            self._invalidate_images()
+        elif event.get('id'):
+            self._invalidate_container(event['id'])
+            if event.get('status') == 'commit':
+                self._invalidate_images()
+
+    @property
+    def api_version(self):
+        """The API version used, as a tuple. Negotiated with the daemon
+           on first use unless configured.
+        """
+        if self._api_version is None:
+            if CONF.docker_api_version == 'auto':
+                self._api_version = self._negotiate_api_version()
+            else:
+                self._api_version = parse_api_version(
+                    CONF.docker_api_version)
+        return self._api_version
+
+    def _negotiate_api_version(self):
+        resp = self.make_request('GET', '/version')
+        server_version = None
+        if resp.code == 200 and resp.json:
+            server_version = resp.json.get('ApiVersion')
+        if not server_version:
+            # NOTE: Daemons older than API 1.5 do not report their version
+            LOG.info(_('Docker daemon does not report its API version, '
+                       'using {0}').format(
+                           '.'.join(map(str, MIN_API_VERSION))))
+            return MIN_API_VERSION
+        version = max(min(parse_api_version(server_version),
+                          MAX_API_VERSION), MIN_API_VERSION)
+        LOG.info(_('Using docker API version {0} (daemon: {1})').format(
+            '.'.join(map(str, version)), server_version))
+        return version
+
+    def supports(self, feature):
+        """Tells whether the API version used provides `feature`, one of
+           the feature constants of this module.
+        """
+        return self.api_version >= feature
+
+    def _url(self, path):
+        return '/v{0}{1}'.format('.'.join(map(str, self.api_version)), path)
+
+    @property
+    def coalesced_requests(self):
+        return self._gets.coalesced
 
     def make_request(self, *args, **kwargs):
+        """Sends a request to the daemon. With stream=True the body is not
+           read, the caller reads it from the response and must close it.
+
+        Identical GETs sent while one is in flight share its response,
+        callers must not modify it.
+        """
+        stream = kwargs.pop('stream', False)
         headers = {}
         if 'headers' in kwargs and kwargs['headers']:
             headers = kwargs['headers']
         if 'Content-Type' not in headers:
             headers['Content-Type'] = 'application/json'
             kwargs['headers'] = headers
-        conn = self.connection
-        conn.request(*args, **kwargs)
-        return Response(conn.getresponse())
+        method, url = args[:2]
+        if method == 'GET' and not stream and not kwargs.get('body'):
+            key = (url, tuple(sorted(headers.iteritems())))
+            return self._gets.do(key, self._request, stream, *args,
+                                 **kwargs)
+        return self._request(stream, *args, **kwargs)
 
-    def list_containers(self, _all=True):
-        resp = self.make_request(
-            'GET',
-            '/v1.4/containers/ps?all={0}&limit=50'.format(int(_all)))
+    def _probe(self):
+        """Raises socket.error if the daemon does not accept connections."""
+        conn = UnixHTTPConnection()
+        try:
+            conn.connect()
+        finally:
+            conn.close()
+
+    def _request(self, stream, *args, **kwargs):
+        """Sends a request, retried with a jittered exponential backoff
+           after a failure: for any request if it could not reach the
+           daemon, whatever the failure for GETs.
+        """
+        idempotent = args[0] == 'GET'
+        attempt = 0
+        while True:
+            self.breaker.check()
+            try:
+                response = self._send(stream, *args, **kwargs)
+            except (socket.error, httplib.HTTPException) as e:
+                if isinstance(e, retry.DaemonUnavailable):
+                    raise
+                self.breaker.record_failure()
+                if attempt >= CONF.docker_request_retries or \
+                        self.breaker.is_open or \
+                        not (idempotent or retry.is_connect_error(e)):
+                    raise
+                delay = retry.backoff_delay(attempt)
+                LOG.warning(_('{0} {1} failed: {2}, retrying in {3:.2f} '
+                              'seconds').format(args[0], args[1], e, delay))
+                attempt += 1
+                eventlet.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return response
+
+    def _send(self, stream, *args, **kwargs):
+        if self._connection:
+            return self._exchange(self._connection, stream, None,
+                                  *args, **kwargs)
+        if stream:
+            return self._send_stream(*args, **kwargs)
+        priority = self.scheduler.acquire()
+        conn = None
+        discard = True
+        try:
+            conn = self.pool.get()
+            response = self._exchange(conn, False, None, *args, **kwargs)
+            discard = response.will_close
+            return response
+        finally:
+            if conn is not None:
+                self.pool.put(conn, discard=discard)
+            self.scheduler.release(priority)
+
+    def _send_stream(self, *args, **kwargs):
+        # NOTE: A streamed pull, push or attach holds its connection until
+        # the transfer is done, it gets its own connection so that it does
+        # not keep a pooled one from the other requests. Its scheduler slot
+        # is only held until the headers arrive: a transfer lasting minutes
+        # would otherwise starve the requests of its priority.
+        priority = self.scheduler.acquire()
+        conn = UnixHTTPConnection()
+        try:
+            return self._exchange(conn, True, conn.close, *args, **kwargs)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                conn.close()
+        finally:
+            self.scheduler.release(priority)
+
+    def _exchange(self, conn, stream, release, *args, **kwargs):
+        """Sends a request on `conn` and returns its Response.
+
+        The request is measured from here: the waits for a scheduler slot
+        and a pooled connection are not part of its latency.
+        """
+        body = kwargs.get('body')
+        request = self.metrics.start(args[0], args[1],
+                                     len(body) if body else 0)
+        try:
+            conn.request(*args, **kwargs)
+            response = Response(conn.getresponse(), skip_body=stream,
+                                release=release)
+        except Exception as e:
+            with excutils.save_and_reraise_exception():
+                request.fail(e)
+        request.finish(response.code, len(response.data or ''))
+        if stream:
+            response.on_close = request.add_bytes_in
+        return response
+
+    def _transfer(self, description, callback, *args, **kwargs):
+        """Sends an image pull or push request and follows its progress
+           stream. Returns False if the daemon reports an error, even in the
+           middle of the stream.
+        """
+        resp = self.make_request(*args, stream=True, **kwargs)
+        try:
+            if resp.code != 200:
+                return False
+            tracker = progress.ProgressTracker(callback)
+            messages = _iter_json_stream(resp, size=65536)
+            while True:
+                timeout = eventlet.Timeout(
+                    CONF.docker_transfer_stall_timeout or None)
+                try:
+                    message = next(messages, None)
+                except eventlet.Timeout as e:
+                    if e is not timeout:
+                        raise
+                    LOG.warning(_('{0} stalled after {1}, aborting').format(
+                        description, tracker))
+                    return False
+                finally:
+                    timeout.cancel()
+                if message is None:
+                    break
+                tracker.update(message)
+            tracker.finish()
+            if tracker.error is not None:
+                LOG.error(_('{0} failed: {1}').format(description,
+                                                      tracker.error))
+                return False
+            LOG.info(_('{0} completed: {1}').format(description, tracker))
+            return True
+        finally:
+            resp.close()
+
+    def iter_containers(self, _all=True, page_size=None):
+        """Walks the whole container listing, one page of `page_size`
+           containers per request. Raises NovaException if a page cannot be
+           listed, partial listings would look like gone containers.
+        """
+        if page_size is None:
+            page_size = CONF.docker_list_page_size
+        path = '/containers/ps'
+        if self.supports(CONTAINERS_JSON):
+            path = '/containers/json'
+        path += '?all={0}&limit={1}'.format(int(_all), page_size)
+        if not _all and self.supports(STATUS_FILTER):
+            # NOTE: Only the running containers are sent by the daemon
+            path += '&filters={0}'.format(urllib.quote(
+                jsonutils.dumps({'status': ['running']})))
+        before = None
+        while True:
+            url = self._url(path)
+            if before:
+                url += '&before={0}'.format(before)
+            page = self._cached('containers', url,
+                                functools.partial(self._get_json, url,
+                                                  required=True))
+            for container in page:
+                # NOTE: docker ignores all=0 as soon as a limit is given
+                if not _all and \
+                        not container.get('Status', '').startswith('Up'):
+                    continue
+                yield container
+            if len(page) < page_size:
+                break
+            # NOTE: docker matches "before" against the short container id
+            before = page[-1]['id'][:12]
+
+    def _get_json(self, url, required=False):
+        resp = self.make_request('GET', url)
+        if resp.code != 200:
+            if required:
+                raise exception.NovaException(
+                    _('Docker daemon answered {0} to GET {1}').format(
+                        resp.code, url))
+            return
         return resp.json
 
-    def create_container(self, args):
+    def list_containers(self, _all=True):
+        return list(self.iter_containers(_all))
+
+    def create_container(self, args, name=None):
+        """Creates a container, named `name` if the API supports named
+           containers. Returns its id or None.
+        """
         data = {
             'Hostname': '',
             'User': '',
@@ -130,94 +826,207 @@ class DockerHTTPClient(object):
             'VolumesFrom': '',
         }
         data.update(args)
+        url = self._url('/containers/create')
+        if name and self.supports(NAMED_CONTAINERS):
+            url += '?name={0}'.format(urllib.quote(name))
         resp = self.make_request(
             'POST',
-            '/v1.4/containers/create',
+            url,
             body=jsonutils.dumps(data))
         if resp.code != 201:
             return
-        obj = jsonutils.loads(resp.data)
-        for k, v in obj.iteritems():
-            if k.lower() == 'id':
-                return v
+        self._invalidate(('containers',))
+        return (resp.json or {}).get('id')
 
-    def start_container(self, container_id):
+    def start_container(self, container_id, lxc_conf=None):
+        body = '{}'
+        if lxc_conf:
+            body = jsonutils.dumps({'LxcConf': [
+                {'Key': k, 'Value': v} for k, v in lxc_conf.iteritems()]})
         resp = self.make_request(
             'POST',
-            '/v1.4/containers/{0}/start'.format(container_id),
-            body='{}')
+            self._url('/containers/{0}/start'.format(container_id)),
+            body=body)
+        self._invalidate_container(container_id)
         return (resp.code == 200)
 
-    def inspect_image(self, image_name):
+    def list_images(self):
+        url = self._url('/images/json?all=0')
+        return self._cached('images', url,
+                            functools.partial(self._get_json, url)) or []
+
+    def delete_image(self, image_name):
         resp = self.make_request(
-            'GET',
-            '/v1.4/images/{0}/json'.format(image_name))
-        if resp.code != 200:
-            return
-        return resp.json
+            'DELETE',
+            self._url('/images/{0}'.format(image_name)))
+        self._invalidate_images()
+        return resp.code in (200, 204)
+
+    def inspect_image(self, image_name):
+        url = self._url('/images/{0}/json'.format(image_name))
+        return self._cached('inspect_image', image_name,
+                            functools.partial(self._get_json, url))
 
     def inspect_container(self, container_id):
-        resp = self.make_request(
-            'GET',
-            '/v1.4/containers/{0}/json'.format(container_id))
-        if resp.code != 200:
-            return
-        return resp.json
+        url = self._url('/containers/{0}/json'.format(container_id))
+        return self._cached('inspect_container', container_id,
+                            functools.partial(self._get_json, url))
+
+    def iter_inspect_containers(self, container_ids, concurrency=None):
+        """Inspects containers concurrently. Yields (container_id, info)
+           tuples in the order the inspections complete.
+        """
+        if concurrency is None:
+            concurrency = CONF.docker_inspect_concurrency
+        container_ids = list(container_ids)
+        pool = greenpool.GreenPool(max(concurrency, 1))
+        results = queue.LightQueue()
+        # NOTE: The priority of a green thread is not inherited by the ones
+        # it spawns.
+        priority = scheduler.current_priority()
+
+        def _inspect(container_id):
+            try:
+                with scheduler.priority(priority):
+                    info = self.inspect_container(container_id)
+            except Exception as e:
+                results.put((container_id, None, e))
+            else:
+                results.put((container_id, info, None))
+
+        def _spawn_all():
+            for container_id in container_ids:
+                pool.spawn_n(_inspect, container_id)
+
+        eventlet.spawn_n(_spawn_all)
+        for _i in xrange(len(container_ids)):
+            container_id, info, error = results.get()
+            if error is not None:
+                raise error
+            yield container_id, info
+
+    def inspect_containers(self, container_ids, concurrency=None):
+        """Inspects containers concurrently. Returns a dict mapping each
+           container id to its info (None if it cannot be inspected).
+        """
+        return dict(self.iter_inspect_containers(container_ids,
+                                                 concurrency=concurrency))
 
     def stop_container(self, container_id):
         timeout = 5
         resp = self.make_request(
             'POST',
-            '/v1.4/containers/{0}/stop?t={1}'.format(container_id, timeout))
+            self._url('/containers/{0}/stop?t={1}'.format(container_id,
+                                                          timeout)))
+        self._invalidate_container(container_id)
         return (resp.code == 204)
 
     def destroy_container(self, container_id):
         resp = self.make_request(
             'DELETE',
-            '/v1.4/containers/{0}'.format(container_id))
+            self._url('/containers/{0}'.format(container_id)))
+        self._invalidate_container(container_id)
         return (resp.code == 204)
 
-    def pull_repository(self, name):
-        parts = name.rsplit(':', 1)
-        url = '/v1.4/images/create?fromImage={0}'.format(parts[0])
-        if len(parts) > 1:
-            url += '&tag={0}'.format(parts[1])
-        resp = self.make_request('POST', url)
-        while True:
-            buf = resp.read(1024)
-            if not buf:
-                # Image pull completed
-                break
-        return (resp.code == 200)
+    @property
+    def coalesced_pulls(self):
+        return self._pulls.coalesced
 
-    def push_repository(self, name, headers=None):
-        url = '/v1.4/images/{0}/push'.format(name)
+    def pull_repository(self, name, callback=None):
+        """Pulls an image. Concurrent pulls of the same image share a single
+           request to the daemon, only the callback of the first caller gets
+           the progress (see progress.ProgressTracker).
+        """
+        repository, tag = _split_repository_tag(name)
+        key = (repository, tag or 'latest')
+        return self._pulls.do(key, self._pull_repository, repository, tag,
+                              callback)
+
+    def _pull_repository(self, repository, tag, callback):
+        url = self._url('/images/create?fromImage={0}'.format(repository))
+        if tag:
+            url += '&tag={0}'.format(tag)
+        description = _('Pull of image {0}').format(repository)
+        try:
+            return self._transfer(description, callback, 'POST', url)
+        finally:
+            self._invalidate_images()
+
+    def push_repository(self, name, headers=None, callback=None):
+        url = self._url('/images/{0}/push'.format(name))
         # NOTE(samalba): docker requires the credentials fields even if
         # they're not needed here.
         body = ('{"username":"foo","password":"bar",'
                 '"auth":"","email":"foo@bar.bar"}')
-        resp = self.make_request('POST', url, headers=headers, body=body)
-        while True:
-            buf = resp.read(1024)
-            if not buf:
-                # Image push completed
-                break
-        return (resp.code == 200)
+        description = _('Push of image {0}').format(name)
+        return self._transfer(description, callback, 'POST', url,
+                              headers=headers, body=body)
 
     def commit_container(self, container_id, name):
-        parts = name.rsplit(':', 1)
-        url = '/v1.4/commit?container={0}&repo={1}'.format(container_id,
-                                                           parts[0])
-        if len(parts) > 1:
-            url += '&tag={0}'.format(parts[1])
+        repository, tag = _split_repository_tag(name)
+        url = self._url('/commit?container={0}&repo={1}'.format(
+            container_id, repository))
+        if tag:
+            url += '&tag={0}'.format(tag)
         resp = self.make_request('POST', url)
+        self._invalidate_images()
         return (resp.code == 201)
 
-    def get_container_logs(self, container_id):
+    def get_info(self):
+        """Returns the system information of the daemon, None if it
+           cannot be read.
+        """
+        return self._get_json(self._url('/info'))
+
+    def get_events(self):
+        """Subscribes to the docker event stream. Returns an iterator of
+           events (dicts with 'status', 'id', 'from' and 'time' keys) or None
+           if the daemon does not provide events.
+        """
+        # NOTE: The stream holds its connection for as long as it is
+        # followed, it must not take a slot from the pool.
+        conn = self._connection or UnixHTTPConnection()
+        conn.request('GET', self._url('/events'),
+                     headers={'Content-Type': 'application/json'})
+        resp = conn.getresponse()
+        if int(resp.status) != 200:
+            conn.close()
+            return
+
+        def _stream():
+            try:
+                for event in _iter_json_stream(resp):
+                    yield event
+            finally:
+                conn.close()
+        return _stream()
+
+    def get_container_logs(self, container_id, max_bytes=None):
+        """Returns the output of a container, only its last `max_bytes`
+           bytes if given. The output is streamed, only the bytes returned
+           are held in memory.
+        """
+        if max_bytes is not None and max_bytes < 1:
+            raise ValueError(_('max_bytes must be positive, got {0}').format(
+                max_bytes))
         resp = self.make_request(
             'POST',
-            ('/v1.4/containers/{0}/attach'
-             '?logs=1&stream=0&stdout=1&stderr=1').format(container_id))
+            self._url(('/containers/{0}/attach'
+                       '?logs=1&stream=0&stdout=1&stderr=1').format(
+                           container_id)),
+            stream=True)
         if resp.code != 200:
+            resp.close()
             return
-        return resp.data
+        chunks = collections.deque()
+        length = 0
+        for chunk in resp.iter_chunks():
+            chunks.append(chunk)
+            length += len(chunk)
+            while max_bytes is not None and \
+                    length - len(chunks[0]) >= max_bytes:
+                length -= len(chunks.popleft())
+        data = ''.join(chunks)
+        if max_bytes is not None:
+            data = data[-max_bytes:]
+        return data
@@ -20,7 +20,6 @@ A Docker Hypervisor which allows running Linux Containers instead of VMs.
 """
 
 import os
-import random
 import socket
 import time
 
@@ -33,9 +32,19 @@ from nova.image import glance
 from nova.openstack.common.gettextutils import _
 from nova.openstack.common import jsonutils
 from nova.openstack.common import log
+from nova.openstack.common import loopingcall
 from nova import utils
+from nova.virt.docker import cache
 import nova.virt.docker.client
+from nova.virt.docker import events
 from nova.virt.docker import hostinfo
+from nova.virt.docker import imagecache
+from nova.virt.docker import index
+from nova.virt.docker import network
+from nova.virt.docker import prefetch
+from nova.virt.docker import records
+from nova.virt.docker import scheduler
+from nova.virt.docker import warmpool
 from nova.virt import driver
 
 
@@ -44,6 +53,19 @@ docker_opts = [
                default=5042,
                help=_('Default TCP port to find the '
                       'docker-registry container')),
+    cfg.IntOpt('docker_registry_port_cache_ttl',
+               default=300,
+               help=_('Number of seconds the discovered docker-registry '
+                      'port is cached')),
+    cfg.IntOpt('docker_image_info_cache_size',
+               default=128,
+               help=_('Maximum number of image metadata entries cached by '
+                      'image name and image id')),
+    cfg.IntOpt('docker_power_state_cache_ttl',
+               default=5,
+               help=_('Number of seconds the power states of all the '
+                      'instances fetched in one listing are reused by '
+                      'get_info')),
 ]
 
 CONF = cfg.CONF
@@ -52,6 +74,9 @@ CONF.import_opt('my_ip', 'nova.netconf')
 
 LOG = log.getLogger(__name__)
 
+# NOTE: Same limit as the libvirt driver
+MAX_CONSOLE_BYTES = 100 * 1024
+
 
 class DockerDriver(driver.ComputeDriver):
     """Docker hypervisor driver."""
@@ -64,6 +89,23 @@ class DockerDriver(driver.ComputeDriver):
     def __init__(self, virtapi):
         super(DockerDriver, self).__init__(virtapi)
         self._docker = None
+        self._event_monitor = None
+        self._container_index = None
+        self._power_states = None
+        self._power_states_expire = 0
+        self._registry = None
+        self._registry_expire = 0
+        self.registry_port_cache_stats = {'hits': 0, 'misses': 0}
+        self._image_info_cache = cache.LRUCache(
+            CONF.docker_image_info_cache_size)
+        self._cgroup_devices_path = None
+        self._network_backend = None
+        self._veth_pool = None
+        self._network_gc = None
+        self._warm_pool = None
+        self._image_cache_manager = None
+        self._prefetcher = None
+        self._prefetch_timer = None
 
     @property
     def docker(self):
@@ -71,10 +113,101 @@ class DockerDriver(driver.ComputeDriver):
             self._docker = nova.virt.docker.client.DockerHTTPClient()
         return self._docker
 
+    @property
+    def network_backend(self):
+        if self._network_backend is None:
+            self._network_backend = network.get_backend()
+        return self._network_backend
+
+    @property
+    def veth_pool(self):
+        if self._veth_pool is None:
+            self._veth_pool = network.VethPool(self.network_backend)
+        return self._veth_pool
+
+    @property
+    def image_cache_manager(self):
+        if self._image_cache_manager is None:
+            self._image_cache_manager = imagecache.ImageCacheManager(
+                self.docker)
+        return self._image_cache_manager
+
+    @property
+    def prefetcher(self):
+        if self._prefetcher is None:
+            self._prefetcher = prefetch.ImagePrefetcher(
+                self.docker, self._get_registry_image_name,
+                lambda image_name: self._inspect_image(image_name) is not None,
+                self.image_cache_manager.evicted_recently)
+        return self._prefetcher
+
+    @property
+    def event_monitor(self):
+        if self._event_monitor is None:
+            self._event_monitor = events.EventMonitor(self.docker)
+            self._event_monitor.add_listener(
+                self.docker.handle_event,
+                resync=self.docker.clear_cache)
+            self._event_monitor.add_listener(
+                self._handle_registry_event,
+                resync=self._invalidate_registry_port)
+            self._event_monitor.add_listener(
+                self._handle_image_event,
+                resync=self._image_info_cache.clear)
+        return self._event_monitor
+
+    @property
+    def container_index(self):
+        if self._container_index is None:
+            self._container_index = index.ContainerIndex(
+                self.docker, self.event_monitor,
+                aliases=self.warm_pool.claims)
+        return self._container_index
+
+    @property
+    def warm_pool(self):
+        if self._warm_pool is None:
+            self._warm_pool = warmpool.WarmPool(self.docker,
+                                                self._get_container_args)
+            if self._warm_pool.enabled and not self._can_set_hostname():
+                LOG.warning(_('The warm pool needs the lxc execution driver '
+                              'of docker to set the hostname of claimed '
+                              'containers, disabling it'))
+                self._warm_pool.size = 0
+        return self._warm_pool
+
+    def _can_set_hostname(self):
+        # NOTE: lxc.utsname is only applied by the lxc execution driver.
+        # Daemons older than 0.9 do not report theirs, they only have it.
+        info = self.docker.get_info()
+        if info is None:
+            return False
+        execution_driver = info.get('ExecutionDriver')
+        return execution_driver is None or execution_driver.startswith('lxc')
+
     def init_host(self, host):
         if self.is_daemon_running() is False:
             raise exception.NovaException(_('Docker daemon is not running or '
                 'is not reachable (check the rights on /var/run/docker.sock)'))
+        # NOTE: The index is built when the event monitor subscribes, or on
+        # its first lookup if the daemon provides no events.
+        self.container_index.start()
+        if self.warm_pool.enabled:
+            container_ids = [c['id'] for c in self.docker.iter_containers()]
+            infos = self.docker.inspect_containers(container_ids).values()
+            self.warm_pool.adopt(records.ContainerInfo.from_inspect(info)
+                                 for info in infos)
+        self.event_monitor.start()
+        for bridge in CONF.docker_veth_pool_bridges:
+            self.veth_pool.fill(bridge)
+        if CONF.docker_network_gc_interval > 0:
+            self._network_gc = loopingcall.FixedIntervalLoopingCall(
+                self._collect_network_garbage)
+            self._network_gc.start(interval=CONF.docker_network_gc_interval)
+        if CONF.docker_prefetch_interval > 0:
+            self._prefetch_timer = loopingcall.FixedIntervalLoopingCall(
+                self.prefetcher.periodic_run)
+            self._prefetch_timer.start(interval=CONF.docker_prefetch_interval)
 
     def is_daemon_running(self):
         try:
@@ -87,14 +220,22 @@ class DockerDriver(driver.ComputeDriver):
             # is huge.
             return False
 
+    @scheduler.background
     def list_instances(self, inspect=False):
         res = []
-        for container in self.docker.list_containers():
-            info = self.docker.inspect_container(container['id'])
+        container_ids = [c['id'] for c in self.docker.iter_containers()]
+        for _id, info in self.docker.iter_inspect_containers(container_ids):
+            if not info:
+                # NOTE: The container was removed since the listing
+                continue
+            name = self.container_index.container_name(
+                records.ContainerInfo.from_inspect(info))
+            if warmpool.is_warm_name(name):
+                continue
             if inspect:
                 res.append(info)
             else:
-                res.append(info['Config'].get('Hostname'))
+                res.append(name)
         return res
 
     def plug_vifs(self, instance, network_info):
@@ -106,24 +247,76 @@ class DockerDriver(driver.ComputeDriver):
         pass
 
     def find_container_by_name(self, name):
-        for info in self.list_instances(inspect=True):
-            if info['Config'].get('Hostname') == name:
+        """Returns the records.ContainerInfo of the container of instance
+           `name`, freshly inspected, or None.
+        """
+        if self.docker.supports(nova.virt.docker.client.NAMED_CONTAINERS):
+            # NOTE: Containers are named after their instance, the daemon
+            # finds them without going through the index.
+            info = records.ContainerInfo.from_inspect(
+                self.docker.inspect_container(name))
+            if info and self.container_index.container_name(info) == name:
+                return info
+        # NOTE: If the indexed container is gone or was renamed, the index
+        # missed an event: rebuild it once before giving up. A container
+        # missing from the index only causes a rebuild if the last one is
+        # not recent, instances already gone would take the whole host
+        # inventory at every lookup.
+        for refresh in (False, True):
+            entry = self.container_index.find(name, refresh=refresh)
+            if not entry:
+                if self.container_index.recently_synced():
+                    return
+                continue
+            info = records.ContainerInfo.from_inspect(
+                self.docker.inspect_container(entry.id))
+            if info and self.container_index.container_name(info) == name:
                 return info
-        return {}
+
+    def _find_container_id(self, name):
+        info = self.find_container_by_name(name)
+        if info is not None:
+            return info.id
+
+    @scheduler.background
+    def list_instance_states(self):
+        """Returns the power state of every instance on the host, keyed by
+           instance name, from a single listing of the containers.
+        """
+        containers = self.docker.list_containers()
+        states = {}
+        running_states = self.container_index.refresh_states(containers)
+        for name, running in running_states.iteritems():
+            if warmpool.is_warm_name(name):
+                continue
+            states[name] = power_state.RUNNING if running \
+                else power_state.SHUTDOWN
+        return states
+
+    def _get_power_states(self):
+        # NOTE: nova syncs power states by calling get_info for every
+        # instance in a row, they all share the same listing.
+        now = time.time()
+        if self._power_states is None or now > self._power_states_expire:
+            self._power_states = self.list_instance_states()
+            self._power_states_expire = now + \
+                CONF.docker_power_state_cache_ttl
+        return self._power_states
+
+    def _invalidate_power_states(self):
+        self._power_states = None
 
     def get_info(self, instance):
-        container = self.find_container_by_name(instance['name'])
-        if not container:
+        state = self._get_power_states().get(instance['name'])
+        if state is None:
             raise exception.InstanceNotFound(instance_id=instance['name'])
-        running = container['State'].get('Running')
         info = {
             'max_mem': 0,
             'mem': 0,
             'num_cpu': 1,
-            'cpu_time': 0
+            'cpu_time': 0,
+            'state': state
         }
-        info['state'] = power_state.RUNNING if running \
-            else power_state.SHUTDOWN
         return info
 
     def get_host_stats(self, refresh=False):
@@ -159,22 +352,35 @@ class DockerDriver(driver.ComputeDriver):
         return stats
 
     def _find_cgroup_devices_path(self):
-        for ln in open('/proc/mounts'):
-            if ln.startswith('cgroup ') and 'devices' in ln:
-                return ln.split(' ')[1]
-
-    def _find_container_pid(self, container_id):
+        if self._cgroup_devices_path is None:
+            for ln in open('/proc/mounts'):
+                if ln.startswith('cgroup ') and 'devices' in ln:
+                    self._cgroup_devices_path = ln.split(' ')[1]
+                    break
+        return self._cgroup_devices_path
+
+    def _find_container_pid(self, container_id, info=None):
+        if info is None or not info.pid:
+            # NOTE: A given info may have been inspected before the
+            # container started.
+            info = records.ContainerInfo.from_inspect(
+                self.docker.inspect_container(container_id))
+        pid = info and info.pid
+        if pid:
+            return int(pid)
+        # NOTE: Docker versions which do not report the pid of the
+        # container: wait for the process to show up in its cgroup.
         cgroup_path = self._find_cgroup_devices_path()
-        lxc_path = os.path.join(cgroup_path, 'lxc')
-        tasks_path = os.path.join(lxc_path, container_id, 'tasks')
-        n = 0
+        if not cgroup_path:
+            return
+        tasks_path = os.path.join(cgroup_path, 'lxc', container_id, 'tasks')
+        # NOTE(samalba): We wait for the process to be spawned inside the
+        # container in order to get the the "container pid". This is
+        # usually really fast. To avoid race conditions on a slow
+        # machine, we allow 10 seconds as a hard limit.
+        deadline = time.time() + 10
+        delay = 0.01
         while True:
-            # NOTE(samalba): We wait for the process to be spawned inside the
-            # container in order to get the the "container pid". This is
-            # usually really fast. To avoid race conditions on a slow
-            # machine, we allow 10 seconds as a hard limit.
-            if n > 20:
-                return
             try:
                 with open(tasks_path) as f:
                     pids = f.readlines()
@@ -182,8 +388,10 @@ class DockerDriver(driver.ComputeDriver):
                         return int(pids[0].strip())
             except IOError:
                 pass
-            time.sleep(0.5)
-            n += 1
+            if time.time() > deadline:
+                return
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
 
     def _find_fixed_ip(self, subnets):
         for subnet in subnets:
@@ -194,57 +402,74 @@ class DockerDriver(driver.ComputeDriver):
     def _setup_network(self, instance, network_info):
         if not network_info:
             return
-        container_id = self.find_container_by_name(instance['name']).get('id')
-        if not container_id:
+        container = self.find_container_by_name(instance['name'])
+        if container is None:
             return
+        container_id = container.id
         network_info = network_info[0]['network']
-        netns_path = '/var/run/netns'
-        if not os.path.exists(netns_path):
+        if not os.path.exists(network.NETNS_PATH):
             utils.execute(
-                'mkdir', '-p', netns_path, run_as_root=True)
-        nspid = self._find_container_pid(container_id)
+                'mkdir', '-p', network.NETNS_PATH, run_as_root=True)
+        nspid = self._find_container_pid(container_id, container)
         if not nspid:
             msg = _('Cannot find any PID under container "{0}"')
             raise RuntimeError(msg.format(container_id))
-        netns_path = os.path.join(netns_path, container_id)
         utils.execute(
             'ln', '-sf', '/proc/{0}/ns/net'.format(nspid),
-            '/var/run/netns/{0}'.format(container_id),
+            network.netns_link(container_id),
             run_as_root=True)
-        rand = random.randint(0, 100000)
-        if_local_name = 'pvnetl{0}'.format(rand)
-        if_remote_name = 'pvnetr{0}'.format(rand)
         bridge = network_info['bridge']
         ip = self._find_fixed_ip(network_info['subnets'])
         if not ip:
             raise RuntimeError(_('Cannot set fixed ip'))
         undo_mgr = utils.UndoManager()
         try:
-            utils.execute(
-                'ip', 'link', 'add', 'name', if_local_name, 'type',
-                'veth', 'peer', 'name', if_remote_name,
-                run_as_root=True)
-            undo_mgr.undo_with(lambda: utils.execute(
-                'ip', 'link', 'delete', if_local_name, run_as_root=True))
-            # NOTE(samalba): Deleting the interface will delete all associated
-            # resources (remove from the bridge, its pair, etc...)
-            utils.execute(
-                'brctl', 'addif', bridge, if_local_name,
-                run_as_root=True)
-            utils.execute(
-                'ip', 'link', 'set', if_local_name, 'up',
-                run_as_root=True)
-            utils.execute(
-                'ip', 'link', 'set', if_remote_name, 'netns', nspid,
-                run_as_root=True)
-            utils.execute(
-                'ip', 'netns', 'exec', container_id, 'ifconfig',
-                if_remote_name, ip,
-                run_as_root=True)
+            pair = self.veth_pool.claim(bridge)
+            if pair:
+                if_local_name, if_remote_name = pair
+                undo_mgr.undo_with(
+                    lambda: self.network_backend.delete_veth(if_local_name))
+                try:
+                    self.network_backend.attach(if_remote_name, nspid,
+                                                container_id, ip)
+                finally:
+                    self.veth_pool.release(if_local_name)
+            else:
+                if_local_name, if_remote_name = network.veth_names(
+                    container_id)
+                self.network_backend.plug(if_local_name, if_remote_name,
+                                          bridge, nspid, container_id, ip,
+                                          undo_mgr)
         except Exception:
             msg = _('Failed to setup the network, rolling back')
             undo_mgr.rollback_and_reraise(msg=msg, instance=instance)
 
+    def _teardown_network(self, container_id):
+        try:
+            if os.path.lexists(network.netns_link(container_id)):
+                network.remove_netns_link(container_id)
+            if_local_name, _if_remote_name = network.veth_names(container_id)
+            if network.interface_exists(if_local_name):
+                self.network_backend.delete_veth(if_local_name)
+        except Exception:
+            # NOTE: The garbage collector will get another chance at it
+            LOG.exception(_('Cannot cleanup the network of container '
+                            '{0}').format(container_id))
+
+    @scheduler.background
+    def _collect_network_garbage(self):
+        def _list_container_ids():
+            return [c['id'] for c in self.docker.iter_containers()]
+        try:
+            gc = network.GarbageCollector(self.network_backend,
+                                          self.veth_pool)
+            removed = gc.collect(_list_container_ids)
+            if removed:
+                LOG.info(_('Removed {0} leaked network namespace links and '
+                           'interfaces').format(removed))
+        except Exception:
+            LOG.exception(_('Cannot collect leaked network resources'))
+
     def _get_memory_limit_bytes(self, instance):
         for metadata in instance.get('system_metadata', []):
             if metadata['deleted']:
@@ -259,45 +484,100 @@ class DockerDriver(driver.ComputeDriver):
             msg = _('Image container format not supported ({0})')
             raise exception.InstanceDeployFailure(msg.format(fmt),
                 instance_id=instance['name'])
+        return self._get_registry_image_name(image['name'])
+
+    def _get_registry_image_name(self, name):
         registry_port = self._get_registry_port()
         return '{0}:{1}/{2}'.format(CONF.my_ip,
                                     registry_port,
-                                    image['name'])
+                                    name)
+
+    def _inspect_image(self, image_name):
+        """Returns the records.ImageInfo of an image, cached by image name
+           and by image id.
+        """
+        info = self._image_info_cache.get(image_name)
+        if info is not None:
+            return info
+        info = records.ImageInfo.from_inspect(
+            self.docker.inspect_image(image_name))
+        if info is None:
+            return
+        self._image_info_cache.put(image_name, info)
+        if info.id:
+            # NOTE: Image ids are immutable, only names can be moved
+            self._image_info_cache.put(info.id, info)
+        return info
+
+    def _invalidate_image_info(self, image_name):
+        self._image_info_cache.pop(image_name)
+
+    def _handle_image_event(self, event):
+        if event.get('status') not in ('pull', 'push', 'tag', 'untag',
+                                       'delete', 'import', 'commit'):
+            return
+        image = event.get('id')
+        if not image:
+            return
+        for key, info in self._image_info_cache.items():
+            if key == image or (info.id or '').startswith(image):
+                self._image_info_cache.pop(key)
 
     def _get_default_cmd(self, image_name):
         default_cmd = ['sh']
-        info = self.docker.inspect_image(image_name)
+        info = self._inspect_image(image_name)
         if not info:
             return default_cmd
-        if not info['container_config']['Cmd']:
+        if not info.cmd:
             return default_cmd
 
-    def spawn(self, context, instance, image_meta, injected_files,
-              admin_password, network_info=None, block_device_info=None):
-        image_name = self._get_image_name(context, instance, image_meta)
+    def _get_container_args(self, image_name, memory):
         args = {
-            'Hostname': instance['name'],
             'Image': image_name,
-            'Memory': self._get_memory_limit_bytes(instance)
+            'Memory': memory
         }
         default_cmd = self._get_default_cmd(image_name)
         if default_cmd:
             args['Cmd'] = default_cmd
-        container_id = self.docker.create_container(args)
+        return args
+
+    def _create_container(self, instance, image_name, memory):
+        args = self._get_container_args(image_name, memory)
+        args['Hostname'] = instance['name']
+        container_id = self.docker.create_container(args,
+                                                    name=instance['name'])
         if not container_id:
             msg = _('Image name "{0}" does not exist, fetching it...')
             LOG.info(msg.format(image_name))
-            res = self.docker.pull_repository(image_name)
+            res = self.docker.pull_repository(
+                image_name, callback=self._log_transfer_progress)
+            self._invalidate_image_info(image_name)
             if res is False:
                 raise exception.InstanceDeployFailure(
                     _('Cannot pull missing image'),
                     instance_id=instance['name'])
-            container_id = self.docker.create_container(args)
+            container_id = self.docker.create_container(
+                args, name=instance['name'])
             if not container_id:
                 raise exception.InstanceDeployFailure(
                     _('Cannot create container'),
                     instance_id=instance['name'])
-        self.docker.start_container(container_id)
+        return container_id
+
+    def spawn(self, context, instance, image_meta, injected_files,
+              admin_password, network_info=None, block_device_info=None):
+        image_name = self._get_image_name(context, instance, image_meta)
+        memory = self._get_memory_limit_bytes(instance)
+        self.image_cache_manager.record_use(image_name)
+        self.prefetcher.record_launch(image_name)
+        self.warm_pool.record_launch(image_name, memory)
+        self._invalidate_power_states()
+        if not self._start_warm_container(instance, image_name, memory):
+            container_id = self._create_container(instance, image_name,
+                                                  memory)
+            self.container_index.add(container_id, instance['name'])
+            if self.docker.start_container(container_id):
+                self.container_index.set_running(container_id, True)
         try:
             self._setup_network(instance, network_info)
         except Exception as e:
@@ -305,17 +585,38 @@ class DockerDriver(driver.ComputeDriver):
             raise exception.InstanceDeployFailure(msg.format(e),
                                                   instance_id=instance['name'])
 
+    def _start_warm_container(self, instance, image_name, memory):
+        container_id = self.warm_pool.claim(image_name, memory,
+                                            instance['name'])
+        if not container_id:
+            return
+        self.container_index.add(container_id, instance['name'])
+        # NOTE: The warm container was created with a placeholder hostname.
+        if self.docker.start_container(
+                container_id, lxc_conf={'lxc.utsname': instance['name']}):
+            self.container_index.set_running(container_id, True)
+            return container_id
+        LOG.warning(_('Cannot start warm container {0}, creating a new '
+                      'one').format(container_id))
+        self.docker.destroy_container(container_id)
+        self.container_index.remove(container_id)
+        self.warm_pool.forget(container_id)
+
     def destroy(self, instance, network_info, block_device_info=None,
                 destroy_disks=True):
-        container_id = self.find_container_by_name(instance['name']).get('id')
+        container_id = self._find_container_id(instance['name'])
         if not container_id:
             return
         self.docker.stop_container(container_id)
-        self.docker.destroy_container(container_id)
+        if self.docker.destroy_container(container_id):
+            self.container_index.remove(container_id)
+            self.warm_pool.forget(container_id)
+        self._invalidate_power_states()
+        self._teardown_network(container_id)
 
     def reboot(self, context, instance, network_info, reboot_type,
                block_device_info=None, bad_volumes_callback=None):
-        container_id = self.find_container_by_name(instance['name']).get('id')
+        container_id = self._find_container_id(instance['name'])
         if not container_id:
             return
         if not self.docker.stop_container(container_id):
@@ -324,46 +625,98 @@ class DockerDriver(driver.ComputeDriver):
         if not self.docker.start_container(container_id):
             LOG.warning(_('Cannot restart the container, '
                           'please check docker logs'))
+        self._invalidate_power_states()
 
     def power_on(self, context, instance, network_info, block_device_info):
-        container_id = self.find_container_by_name(instance['name']).get('id')
+        container_id = self._find_container_id(instance['name'])
         if not container_id:
             return
-        self.docker.start_container(container_id)
+        if self.docker.start_container(container_id):
+            self.container_index.set_running(container_id, True)
+        self._invalidate_power_states()
 
     def power_off(self, instance):
-        container_id = self.find_container_by_name(instance['name']).get('id')
+        container_id = self._find_container_id(instance['name'])
         if not container_id:
             return
-        self.docker.stop_container(container_id)
+        if self.docker.stop_container(container_id):
+            self.container_index.set_running(container_id, False)
+        self._invalidate_power_states()
 
     def get_console_output(self, instance):
-        container_id = self.find_container_by_name(instance['name']).get('id')
+        container_id = self._find_container_id(instance['name'])
         if not container_id:
             return
-        return self.docker.get_container_logs(container_id)
+        return self.docker.get_container_logs(container_id,
+                                              max_bytes=MAX_CONSOLE_BYTES)
 
-    def _get_registry_port(self):
+    @scheduler.background
+    def manage_image_cache(self, context, all_instances):
+        self.image_cache_manager.manage()
+
+    def _find_registry(self):
+        """Returns the (container_id, port) of the docker-registry
+           container, container_id is None if there is no such container.
+        """
         default_port = CONF.docker_registry_default_port
         registry = None
-        for container in self.docker.list_containers(_all=False):
-            container = self.docker.inspect_container(container['id'])
-            if 'docker-registry' in container['Path']:
+        container_ids = [c['id']
+                         for c in self.docker.iter_containers(_all=False)]
+        for _id, container in self.docker.iter_inspect_containers(
+                container_ids):
+            container = records.ContainerInfo.from_inspect(container)
+            if container and 'docker-registry' in (container.path or ''):
                 registry = container
                 break
         if not registry:
-            return default_port
+            return None, default_port
         # NOTE(samalba): The registry service always binds on port 5000 in the
         # container
         try:
-            return container['NetworkSettings']['PortMapping']['Tcp']['5000']
+            port = registry.port_mapping['Tcp']['5000']
         except (KeyError, TypeError):
             # NOTE(samalba): Falling back to a default port allows more
             # flexibility (run docker-registry outside a container)
-            return default_port
+            port = default_port
+        return registry.id, port
+
+    def _get_registry_port(self):
+        now = time.time()
+        if self._registry is not None and now < self._registry_expire:
+            self.registry_port_cache_stats['hits'] += 1
+            return self._registry[1]
+        self.registry_port_cache_stats['misses'] += 1
+        self._registry = self._find_registry()
+        self._registry_expire = now + CONF.docker_registry_port_cache_ttl
+        LOG.debug(_('Found docker-registry port {0} (cache stats: '
+                    '{1})').format(self._registry[1],
+                                   self.registry_port_cache_stats))
+        return self._registry[1]
+
+    def _invalidate_registry_port(self):
+        self._registry = None
+
+    def _handle_registry_event(self, event):
+        if event.get('status') not in ('start', 'stop', 'die', 'kill',
+                                       'destroy'):
+            return
+        if self._registry is None:
+            return
+        registry_id = self._registry[0]
+        container_id = event.get('id') or ''
+        if registry_id and container_id and \
+                registry_id.startswith(container_id):
+            self._invalidate_registry_port()
+        elif 'registry' in (event.get('from') or ''):
+            # NOTE: A registry container may have been (re)started
+            self._invalidate_registry_port()
+
+    def _log_transfer_progress(self, tracker):
+        LOG.debug(_('Image transfer {0}: {1}').format(tracker.status,
+                                                      tracker))
 
     def snapshot(self, context, instance, image_href, update_task_state):
-        container_id = self.find_container_by_name(instance['name']).get('id')
+        container_id = self._find_container_id(instance['name'])
         if not container_id:
             raise exception.InstanceNotRunning(instance_id=instance['uuid'])
         update_task_state(task_state=task_states.IMAGE_PENDING_UPLOAD)
@@ -378,7 +731,12 @@ class DockerDriver(driver.ComputeDriver):
                                     name)
         commit_name = name if not default_tag else name + ':latest'
         self.docker.commit_container(container_id, commit_name)
+        self._invalidate_image_info(name)
+        self._invalidate_image_info(commit_name)
         update_task_state(task_state=task_states.IMAGE_UPLOADING,
                           expected_state=task_states.IMAGE_PENDING_UPLOAD)
         headers = {'X-Meta-Glance-Image-Id': image_href}
-        self.docker.push_repository(name, headers=headers)
+        # NOTE: update_task_state does not take any progress, it is only
+        # logged.
+        self.docker.push_repository(name, headers=headers,
+                                    callback=self._log_transfer_progress)
@@ -0,0 +1,99 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (c) 2013 dotCloud, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet
+from eventlet import greenthread
+from oslo.config import cfg
+
+from nova.openstack.common.gettextutils import _
+from nova.openstack.common import log as logging
+
+
+docker_events_opts = [
+    cfg.IntOpt('docker_events_retry_interval',
+               default=10,
+               help=_('Number of seconds to wait before subscribing again '
+                      'to the docker event stream after losing it')),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(docker_events_opts)
+
+LOG = logging.getLogger(__name__)
+
+
+class EventMonitor(object):
+    """Follows the docker event stream in a green thread and dispatches every
+       event to the registered listeners.
+
+    Listeners are called with the event dict. Resync callbacks are called
+    every time the stream is (re)established, since events may have been
+    missed while it was down.
+    """
+
+    def __init__(self, docker):
+        self._docker = docker
+        self._listeners = []
+        self._resync_callbacks = []
+        self._thread = None
+        self.connected = False
+
+    def add_listener(self, callback, resync=None):
+        self._listeners.append(callback)
+        if resync:
+            self._resync_callbacks.append(resync)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = eventlet.spawn(self._run)
+
+    def stop(self):
+        if self._thread is not None:
+            self._thread.kill()
+            self._thread = None
+        self.connected = False
+
+    def _dispatch(self, event):
+        for callback in self._listeners:
+            try:
+                callback(event)
+            except Exception:
+                LOG.exception(_('Docker event listener failed'))
+
+    def _follow(self):
+        events = self._docker.get_events()
+        if events is None:
+            LOG.warning(_('Docker daemon does not provide an event stream'))
+            return
+        self.connected = True
+        for callback in self._resync_callbacks:
+            try:
+                callback()
+            except Exception:
+                LOG.exception(_('Cannot resync after subscribing to docker '
+                                'events'))
+        for event in events:
+            self._dispatch(event)
+
+    def _run(self):
+        while True:
+            try:
+                self._follow()
+            except Exception:
+                LOG.exception(_('Lost the docker event stream'))
+            self.connected = False
+            greenthread.sleep(CONF.docker_events_retry_interval)
@@ -0,0 +1,160 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (c) 2013 dotCloud, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import time
+
+from oslo.config import cfg
+
+from nova.openstack.common.gettextutils import _
+from nova.openstack.common import log as logging
+from nova.virt.docker import hostinfo
+
+
+docker_imagecache_opts = [
+    cfg.IntOpt('docker_image_cache_min_free_percent',
+               default=10,
+               help=_('Unused images are removed, least recently used first, '
+                      'when the free space of the docker storage drops below '
+                      'this percentage')),
+    cfg.IntOpt('docker_image_cache_target_free_percent',
+               default=20,
+               help=_('Percentage of free space at which the removal of '
+                      'unused images stops')),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(docker_imagecache_opts)
+
+LOG = logging.getLogger(__name__)
+
+
+def tagged_name(image_name):
+    """Returns `image_name` with the default tag if it has none. Docker
+       lists the images pulled without a tag under the default one.
+    """
+    # NOTE: A colon before the last '/' separates a registry port, not a tag
+    if ':' not in image_name.rpartition('/')[2]:
+        return image_name + ':latest'
+    return image_name
+
+
+class ImageCacheManager(object):
+    """Removes the images no container uses, least recently used first,
+       when the docker storage runs out of space.
+    """
+
+    def __init__(self, docker):
+        self._docker = docker
+        self._last_used = {}
+        self._evicted = {}
+
+    def record_use(self, image_name, when=None):
+        image_name = tagged_name(image_name)
+        self._last_used[image_name] = when or time.time()
+        self._evicted.pop(image_name, None)
+
+    def evicted_recently(self, image_name, period):
+        """Returns True if `image_name` was removed less than `period`
+           seconds ago.
+        """
+        when = self._evicted.get(tagged_name(image_name))
+        return when is not None and time.time() - when < period
+
+    def _entry_names(self, entry):
+        # NOTE: From API 1.7 docker lists one entry per image with all of its
+        # repository:tag names in RepoTags.
+        repo_tags = entry.get('RepoTags')
+        if repo_tags is not None:
+            return [name for name in repo_tags
+                    if name and name != '<none>:<none>']
+        repository = entry.get('Repository')
+        if not repository or repository == '<none>':
+            return []
+        tag = entry.get('Tag')
+        if tag and tag != '<none>':
+            return ['{0}:{1}'.format(repository, tag)]
+        return [repository]
+
+    def _list_images(self):
+        # NOTE: Older docker versions list one entry per repository and tag,
+        # group them by image id.
+        images = {}
+        for entry in self._docker.list_images():
+            image = images.setdefault(entry['id'], {
+                'id': entry['id'],
+                'names': [],
+                'created': entry.get('Created', 0),
+                'size': entry.get('Size', 0),
+            })
+            image['names'].extend(self._entry_names(entry))
+        return images.values()
+
+    def _is_referenced(self, image, references):
+        for reference in references:
+            if reference in image['names'] or \
+                    image['id'].startswith(reference):
+                return True
+            # NOTE: Containers created from the default tag reference the
+            # bare repository name.
+            if reference + ':latest' in image['names']:
+                return True
+        return False
+
+    def _last_use(self, image):
+        uses = [self._last_used.get(name, 0) for name in image['names']]
+        uses.append(self._last_used.get(image['id'], 0))
+        return max(uses) or image['created']
+
+    def _remove(self, image):
+        names = image['names'] or [image['id']]
+        removed = False
+        for name in names:
+            if self._docker.delete_image(name):
+                removed = True
+                self._last_used.pop(name, None)
+                self._evicted[name] = time.time()
+        return removed
+
+    def manage(self):
+        """Removes unused images until enough space is free. Returns the
+           number of bytes reclaimed.
+        """
+        disk = hostinfo.get_disk_usage()
+        low_watermark = disk['total'] * \
+            CONF.docker_image_cache_min_free_percent / 100
+        if disk['available'] >= low_watermark:
+            return 0
+        high_watermark = disk['total'] * \
+            CONF.docker_image_cache_target_free_percent / 100
+        references = set(c.get('Image')
+                         for c in self._docker.iter_containers())
+        candidates = [image for image in self._list_images()
+                      if not self._is_referenced(image, references)]
+        candidates.sort(key=self._last_use)
+        available = disk['available']
+        removed = 0
+        for image in candidates:
+            if available >= high_watermark:
+                break
+            if not self._remove(image):
+                continue
+            removed += 1
+            available = hostinfo.get_disk_usage()['available']
+        reclaimed = max(available - disk['available'], 0)
+        LOG.info(_('Removed {0} unused images, reclaimed {1} bytes').format(
+            removed, reclaimed))
+        return reclaimed
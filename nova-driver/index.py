@@ -0,0 +1,252 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (c) 2013 dotCloud, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import time
+
+from eventlet import semaphore
+from oslo.config import cfg
+
+from nova.openstack.common.gettextutils import _
+from nova.openstack.common import log as logging
+from nova.openstack.common import loopingcall
+from nova.virt.docker import records
+from nova.virt.docker import scheduler
+
+
+docker_index_opts = [
+    cfg.IntOpt('docker_index_resync_interval',
+               default=600,
+               help=_('Number of seconds between two full rebuilds of the '
+                      'container index, 0 disables them')),
+    cfg.IntOpt('docker_index_miss_resync_interval',
+               default=60,
+               help=_('Minimum number of seconds between two rebuilds of the '
+                      'container index caused by a container not found in '
+                      'it')),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(docker_index_opts)
+
+LOG = logging.getLogger(__name__)
+
+# NOTE: Container events which do not require to inspect a known container
+# again, mapped to its resulting running state.
+_STATE_EVENTS = {
+    'start': True,
+    'restart': True,
+    'stop': False,
+    'die': False,
+    'kill': False,
+}
+
+
+class ContainerIndex(object):
+    """In-memory map of instance names (container hostnames) to the
+       records.ContainerInfo of their container.
+
+    The map is built by inspecting every container once, then kept current
+    from the docker event stream. While the event stream is down, a lookup
+    miss triggers a full rebuild instead of being trusted.
+    """
+
+    def __init__(self, docker, monitor=None, aliases=None):
+        self._docker = docker
+        self._monitor = monitor
+        # NOTE: Names of the containers whose hostname is not the instance
+        # name, keyed by container id.
+        self._aliases = aliases if aliases is not None else {}
+        self._by_name = {}
+        self._by_id = {}
+        self._synced = False
+        self._synced_at = 0
+        self._lock = semaphore.Semaphore()
+        # NOTE: Changes made while a resync runs, replayed on the rebuilt
+        # maps since the containers they touch may have been listed or
+        # inspected before the change.
+        self._journal = None
+        self._timer = None
+        if monitor is not None:
+            monitor.add_listener(self.handle_event, resync=self.resync)
+
+    @property
+    def trusted(self):
+        return (self._synced and self._monitor is not None and
+                self._monitor.connected)
+
+    def start(self):
+        interval = CONF.docker_index_resync_interval
+        if self._timer is not None or interval <= 0:
+            return
+        self._timer = loopingcall.FixedIntervalLoopingCall(
+            self._periodic_resync)
+        self._timer.start(interval=interval, initial_delay=interval)
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.stop()
+            self._timer = None
+
+    @scheduler.background
+    def _periodic_resync(self):
+        try:
+            self.resync()
+        except Exception:
+            LOG.exception(_('Cannot rebuild the container index'))
+
+    def container_name(self, info):
+        """Returns the instance name of a container from its
+           records.ContainerInfo.
+        """
+        return self._aliases.get(info.id) or info.hostname
+
+    def resync(self):
+        with self._lock:
+            self._journal = []
+            try:
+                by_name, by_id = self._rebuild()
+            except Exception:
+                self._journal = None
+                raise
+            journal, self._journal = self._journal, None
+            self._by_name = by_name
+            self._by_id = by_id
+            for method, args in journal:
+                method(*args)
+            self._synced = True
+            self._synced_at = time.time()
+
+    def recently_synced(self):
+        """Returns True if the index was rebuilt less than
+           docker_index_miss_resync_interval seconds ago.
+        """
+        return (self._synced and time.time() - self._synced_at <
+                CONF.docker_index_miss_resync_interval)
+
+    def _rebuild(self):
+        by_name = {}
+        by_id = {}
+        container_ids = [c['id'] for c in self._docker.iter_containers()]
+        for _id, info in self._docker.iter_inspect_containers(
+                container_ids):
+            info = records.ContainerInfo.from_inspect(info)
+            if info is None:
+                continue
+            name = self.container_name(info)
+            by_name[name] = info
+            by_id[info.id] = name
+        return by_name, by_id
+
+    def _record(self, method, *args):
+        if self._journal is not None:
+            self._journal.append((method, args))
+
+    def _resolve_id(self, container_id):
+        if container_id in self._by_id:
+            return container_id
+        # NOTE: Some docker versions only report the short id in events
+        for full_id in self._by_id:
+            if full_id.startswith(container_id):
+                return full_id
+
+    def add(self, container_id, name, running=False):
+        self._put(name, records.ContainerInfo(container_id, hostname=name,
+                                              running=running))
+
+    def _put(self, name, info):
+        self._record(self._put, name, info)
+        old_name = self._by_id.get(info.id)
+        if old_name is not None and old_name != name:
+            self._by_name.pop(old_name, None)
+        self._by_name[name] = info
+        self._by_id[info.id] = name
+
+    def set_running(self, container_id, running):
+        self._record(self.set_running, container_id, running)
+        container_id = self._resolve_id(container_id)
+        if container_id is None:
+            return False
+        entry = self._by_name.get(self._by_id[container_id])
+        if entry is not None:
+            entry.running = running
+        return True
+
+    def remove(self, container_id):
+        self._record(self.remove, container_id)
+        container_id = self._resolve_id(container_id)
+        if container_id is None:
+            return
+        name = self._by_id.pop(container_id)
+        entry = self._by_name.get(name)
+        if entry is not None and entry.id == container_id:
+            del self._by_name[name]
+
+    def refresh(self, container_id):
+        info = records.ContainerInfo.from_inspect(
+            self._docker.inspect_container(container_id))
+        if info is None:
+            self.remove(container_id)
+            return
+        self._put(self.container_name(info), info)
+
+    def refresh_states(self, containers):
+        """Updates the running state of the indexed containers from a
+           container listing and returns a {name: running} dict for the
+           listed containers. Only containers unknown to the index are
+           inspected.
+        """
+        states = {}
+        for container in containers:
+            running = container.get('Status', '').startswith('Up')
+            container_id = self._resolve_id(container['id'])
+            if container_id is None:
+                self.refresh(container['id'])
+                container_id = self._resolve_id(container['id'])
+                if container_id is None:
+                    continue
+            else:
+                self.set_running(container_id, running)
+            name = self._by_id[container_id]
+            states[name] = self._by_name[name].running
+        return states
+
+    def handle_event(self, event):
+        status = event.get('status')
+        container_id = event.get('id')
+        if not container_id:
+            return
+        if status == 'destroy':
+            self.remove(container_id)
+        elif status in _STATE_EVENTS:
+            if not self.set_running(container_id, _STATE_EVENTS[status]):
+                self.refresh(container_id)
+        elif status == 'create':
+            self.refresh(container_id)
+
+    def find(self, name, refresh=False):
+        """Returns the records.ContainerInfo of the container named `name`
+           or None.
+        """
+        resynced = False
+        if refresh or not self._synced:
+            self.resync()
+            resynced = True
+        entry = self._by_name.get(name)
+        if entry is None and not resynced and not self.trusted:
+            self.resync()
+            entry = self._by_name.get(name)
+        return entry
@@ -0,0 +1,269 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (c) 2013 dotCloud, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import bisect
+import collections
+import re
+import socket
+import time
+
+from oslo.config import cfg
+
+from nova.openstack.common.gettextutils import _
+from nova.openstack.common import log as logging
+
+
+docker_metrics_opts = [
+    cfg.ListOpt('docker_metrics_sinks',
+                default=[],
+                help=_('Where the docker request metrics are sent besides '
+                       'the in-process snapshot: "log" for a periodic '
+                       'summary, "statsd" for statsd packets')),
+    cfg.IntOpt('docker_metrics_log_interval',
+               default=300,
+               help=_('Number of seconds between two summaries of the '
+                      'docker request metrics in the log')),
+    cfg.StrOpt('docker_metrics_statsd_host',
+               default='127.0.0.1',
+               help=_('Host of the statsd collector')),
+    cfg.IntOpt('docker_metrics_statsd_port',
+               default=8125,
+               help=_('Port of the statsd collector')),
+    cfg.StrOpt('docker_metrics_statsd_prefix',
+               default='nova.docker',
+               help=_('Prefix of the statsd metric names')),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(docker_metrics_opts)
+
+LOG = logging.getLogger(__name__)
+
+# NOTE: Upper bounds of the latency buckets, in milliseconds
+LATENCY_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000,
+                   10000, float('inf'))
+
+_VERSION_RE = re.compile(r'^/v[\d.]+')
+
+# NOTE: Image names may contain slashes (registry and namespace)
+_PATH_TEMPLATES = (
+    (re.compile(r'^/containers/(?!json$|ps$|create$)[^/]+((?:/.*)?)$'),
+     r'/containers/{id}\1'),
+    (re.compile(r'^/images/.+/(json|push)$'), r'/images/{name}/\1'),
+    (re.compile(r'^/images/(?!json$|create$).+$'), '/images/{name}'),
+)
+
+
+def template_path(url):
+    """Returns the endpoint of `url`: its path without the API version and
+       with the container ids and image names replaced by placeholders.
+    """
+    path = _VERSION_RE.sub('', url.split('?', 1)[0])
+    for regex, template in _PATH_TEMPLATES:
+        if regex.match(path):
+            return regex.sub(template, path)
+    return path
+
+
+class Histogram(object):
+    """Counts values in the LATENCY_BUCKETS."""
+
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, percent):
+        """Returns the upper bound of the bucket holding the `percent`
+           percentile, the max value for the last bucket.
+        """
+        if not self.count:
+            return 0
+        rank = self.count * percent / 100.0
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class EndpointStats(object):
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.statuses = collections.Counter()
+        self.errors = 0
+        self.in_flight = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def snapshot(self):
+        latency = self.latency
+        return {
+            'requests': latency.count,
+            'errors': self.errors,
+            'in_flight': self.in_flight,
+            'statuses': dict(self.statuses),
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'latency_ms': {
+                'mean': latency.total / latency.count if latency.count
+                else 0,
+                'p50': latency.percentile(50),
+                'p95': latency.percentile(95),
+                'p99': latency.percentile(99),
+                'max': latency.max,
+                'buckets': dict(zip(LATENCY_BUCKETS, latency.counts)),
+            },
+        }
+
+
+class Request(object):
+    """A request being measured, returned by Metrics.start."""
+
+    def __init__(self, metrics, method, path, stats):
+        self._metrics = metrics
+        self.method = method
+        self.path = path
+        self._stats = stats
+        self._started = time.time()
+
+    def finish(self, status, bytes_in):
+        duration = (time.time() - self._started) * 1000
+        stats = self._stats
+        stats.in_flight -= 1
+        stats.statuses[status] += 1
+        stats.bytes_in += bytes_in
+        stats.latency.add(duration)
+        self._metrics.recorded(self, status, duration)
+
+    def fail(self, error):
+        duration = (time.time() - self._started) * 1000
+        self._stats.in_flight -= 1
+        self._stats.errors += 1
+        self._metrics.recorded(self, None, duration)
+
+    def add_bytes_in(self, count):
+        """Counts the bytes of a body streamed after `finish`."""
+        self._stats.bytes_in += count
+
+
+class LogSink(object):
+    """Logs a summary of the metrics every docker_metrics_log_interval
+       seconds.
+    """
+
+    def __init__(self, interval=None):
+        if interval is None:
+            interval = CONF.docker_metrics_log_interval
+        self.interval = interval
+        self._last_flush = time.time()
+
+    def record(self, metrics, request, status, duration):
+        now = time.time()
+        if now - self._last_flush < self.interval:
+            return
+        self._last_flush = now
+        msg = _('Docker {0}: {1} requests, {2} errors, p50 {3}ms, p99 {4}ms, '
+                'max {5:.1f}ms, statuses {6}')
+        for endpoint, stats in sorted(metrics.snapshot().iteritems()):
+            latency = stats['latency_ms']
+            LOG.info(msg.format(endpoint, stats['requests'], stats['errors'],
+                                latency['p50'], latency['p99'],
+                                latency['max'], stats['statuses']))
+
+
+class StatsdSink(object):
+    """Sends a timer and a counter per request to a statsd collector over
+       UDP, losing them silently if it is not there.
+    """
+
+    def __init__(self, host=None, port=None, prefix=None):
+        self.address = (host or CONF.docker_metrics_statsd_host,
+                        port or CONF.docker_metrics_statsd_port)
+        self.prefix = prefix or CONF.docker_metrics_statsd_prefix
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def _name(self, request):
+        path = re.sub(r'[{}]', '', request.path).strip('/')
+        return '{0}.{1}.{2}'.format(self.prefix, request.method.lower(),
+                                    re.sub(r'[^\w]+', '_', path))
+
+    def record(self, metrics, request, status, duration):
+        name = self._name(request)
+        lines = ['{0}.latency:{1:.3f}|ms'.format(name, duration),
+                 '{0}.status.{1}:1|c'.format(name, status or 'error')]
+        try:
+            self._socket.sendto('\n'.join(lines), self.address)
+        except socket.error:
+            pass
+
+
+_SINKS = {
+    'log': LogSink,
+    'statsd': StatsdSink,
+}
+
+
+class Metrics(object):
+    """Per endpoint (method and templated path) latency histograms, status
+       codes, errors, bytes in and out, and in-flight counts of the
+       requests to the docker daemon.
+
+    `snapshot` returns them all, every recorded request is also passed to
+    the sinks (objects with a record(metrics, request, status, duration)
+    method).
+    """
+
+    def __init__(self, sinks=None):
+        if sinks is None:
+            sinks = []
+            for name in CONF.docker_metrics_sinks:
+                if name not in _SINKS:
+                    LOG.warning(_('Unknown docker metrics sink '
+                                  '{0}').format(name))
+                    continue
+                sinks.append(_SINKS[name]())
+        self.sinks = sinks
+        self._endpoints = collections.defaultdict(EndpointStats)
+
+    def start(self, method, url, bytes_out=0):
+        path = template_path(url)
+        stats = self._endpoints['{0} {1}'.format(method, path)]
+        stats.in_flight += 1
+        stats.bytes_out += bytes_out
+        return Request(self, method, path, stats)
+
+    def recorded(self, request, status, duration):
+        for sink in self.sinks:
+            try:
+                sink.record(self, request, status, duration)
+            except Exception:
+                LOG.exception(_('Docker metrics sink failed'))
+
+    def snapshot(self):
+        """Returns the metrics of every endpoint, keyed by "METHOD path"."""
+        return dict((endpoint, stats.snapshot())
+                    for endpoint, stats in self._endpoints.iteritems())
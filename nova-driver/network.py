@@ -0,0 +1,344 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (c) 2013 dotCloud, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import os
+import re
+import uuid
+
+import eventlet
+from oslo.config import cfg
+
+from nova import exception
+from nova.openstack.common.gettextutils import _
+from nova.openstack.common import log as logging
+from nova import utils
+
+
+docker_network_opts = [
+    cfg.StrOpt('docker_network_backend',
+               default='execute',
+               help=_('How container networks are plumbed: "execute" runs '
+                      'one privileged command per step, "batch" runs all the '
+                      'link changes in a single "ip -batch" call (requires '
+                      'an iproute2 supporting "ip link set master")')),
+    cfg.IntOpt('docker_veth_pool_size',
+               default=0,
+               help=_('Number of veth pairs kept created and attached to '
+                      'each bridge, ready to be moved into new containers. '
+                      '0 disables the pool')),
+    cfg.ListOpt('docker_veth_pool_bridges',
+                default=[],
+                help=_('Bridges for which the veth pool is filled when the '
+                       'compute service starts, other bridges are pooled '
+                       'after their first use')),
+    cfg.IntOpt('docker_network_gc_interval',
+               default=0,
+               help=_('Number of seconds between two removals of the network '
+                      'namespace links and veth interfaces left behind by '
+                      'deleted containers, 0 disables it')),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(docker_network_opts)
+
+LOG = logging.getLogger(__name__)
+
+NETNS_PATH = '/var/run/netns'
+SYS_NET_PATH = '/sys/class/net'
+
+LOCAL_PREFIX = 'pvnetl'
+REMOTE_PREFIX = 'pvnetr'
+
+_CONTAINER_ID_RE = re.compile('^[0-9a-f]{64}$')
+_ID_PREFIX_LEN = 9
+
+
+def veth_names(container_id):
+    """Returns the (if_local_name, if_remote_name) pair of a container. The
+       names are derived from its id and limited to 15 characters.
+    """
+    suffix = container_id[:_ID_PREFIX_LEN]
+    return LOCAL_PREFIX + suffix, REMOTE_PREFIX + suffix
+
+
+def netns_link(container_id):
+    return os.path.join(NETNS_PATH, container_id)
+
+
+def remove_netns_link(container_id):
+    utils.execute('rm', '-f', netns_link(container_id), run_as_root=True)
+
+
+def interface_exists(name):
+    return os.path.exists(os.path.join(SYS_NET_PATH, name))
+
+
+class ExecuteBackend(object):
+    """Plumbs container networks with one privileged command per step."""
+
+    def create_veth(self, if_local_name, if_remote_name, bridge):
+        utils.execute(
+            'ip', 'link', 'add', 'name', if_local_name, 'type',
+            'veth', 'peer', 'name', if_remote_name,
+            run_as_root=True)
+        try:
+            utils.execute(
+                'brctl', 'addif', bridge, if_local_name,
+                run_as_root=True)
+            utils.execute(
+                'ip', 'link', 'set', if_local_name, 'up',
+                run_as_root=True)
+        except Exception:
+            self.delete_veth(if_local_name)
+            raise
+
+    def delete_veth(self, if_local_name):
+        # NOTE(samalba): Deleting the interface will delete all associated
+        # resources (remove from the bridge, its pair, etc...)
+        utils.execute('ip', 'link', 'delete', if_local_name,
+                      run_as_root=True, check_exit_code=False)
+
+    def attach(self, if_remote_name, nspid, container_id, ip):
+        utils.execute(
+            'ip', 'link', 'set', if_remote_name, 'netns', nspid,
+            run_as_root=True)
+        utils.execute(
+            'ip', 'netns', 'exec', container_id, 'ifconfig',
+            if_remote_name, ip,
+            run_as_root=True)
+
+    def plug(self, if_local_name, if_remote_name, bridge, nspid,
+             container_id, ip, undo_mgr):
+        self.create_veth(if_local_name, if_remote_name, bridge)
+        undo_mgr.undo_with(lambda: self.delete_veth(if_local_name))
+        self.attach(if_remote_name, nspid, container_id, ip)
+
+
+class IPBatchBackend(ExecuteBackend):
+    """Plumbs container networks with as few privileged commands as possible:
+       all the link changes go through a single "ip -batch" call.
+    """
+
+    def _batch(self, *commands):
+        script = ''.join(' '.join(str(arg) for arg in command) + '\n'
+                         for command in commands)
+        utils.execute('ip', '-batch', '-', process_input=script,
+                      run_as_root=True)
+
+    def _create_commands(self, if_local_name, if_remote_name, bridge):
+        return [
+            ('link', 'add', 'name', if_local_name, 'type', 'veth',
+             'peer', 'name', if_remote_name),
+            ('link', 'set', if_local_name, 'master', bridge),
+            ('link', 'set', if_local_name, 'up'),
+        ]
+
+    def create_veth(self, if_local_name, if_remote_name, bridge):
+        try:
+            self._batch(*self._create_commands(if_local_name, if_remote_name,
+                                               bridge))
+        except Exception:
+            self.delete_veth(if_local_name)
+            raise
+
+    def attach(self, if_remote_name, nspid, container_id, ip):
+        self._batch(('link', 'set', if_remote_name, 'netns', nspid))
+        utils.execute(
+            'ip', 'netns', 'exec', container_id, 'ifconfig',
+            if_remote_name, ip,
+            run_as_root=True)
+
+    def plug(self, if_local_name, if_remote_name, bridge, nspid,
+             container_id, ip, undo_mgr):
+        # NOTE: The batch may fail half way, the undo must not assume the
+        # interface exists.
+        undo_mgr.undo_with(lambda: self.delete_veth(if_local_name))
+        commands = self._create_commands(if_local_name, if_remote_name,
+                                         bridge)
+        commands.append(('link', 'set', if_remote_name, 'netns', nspid))
+        self._batch(*commands)
+        utils.execute(
+            'ip', 'netns', 'exec', container_id, 'ifconfig',
+            if_remote_name, ip,
+            run_as_root=True)
+
+
+class VethPool(object):
+    """Keeps veth pairs created and attached to bridges ahead of time, so
+       that a new container only has to take one and move its peer into its
+       network namespace. Claimed pairs are replaced in a green thread.
+    """
+
+    LOCAL_PREFIX = 'pvpooll'
+    REMOTE_PREFIX = 'pvpoolr'
+
+    def __init__(self, backend, size=None):
+        if size is None:
+            size = CONF.docker_veth_pool_size
+        self.size = size
+        self._backend = backend
+        self._pairs = collections.defaultdict(collections.deque)
+        self._refilling = set()
+        # NOTE: Pairs being created or claimed but not moved into their
+        # container yet, they must not be garbage collected.
+        self._busy = set()
+
+    def _new_names(self):
+        # NOTE: Interface names are limited to 15 characters
+        suffix = uuid.uuid4().hex[:8]
+        return self.LOCAL_PREFIX + suffix, self.REMOTE_PREFIX + suffix
+
+    def names(self):
+        """Returns the host side names of all the pooled interfaces."""
+        names = set(pair[0] for pairs in self._pairs.itervalues()
+                    for pair in pairs)
+        return names | self._busy
+
+    def fill(self, bridge):
+        if self.size <= 0 or bridge in self._refilling:
+            return
+        self._refilling.add(bridge)
+        eventlet.spawn_n(self._refill, bridge)
+
+    def _refill(self, bridge):
+        pairs = self._pairs[bridge]
+        try:
+            while len(pairs) < self.size:
+                if_local_name, if_remote_name = self._new_names()
+                self._busy.add(if_local_name)
+                try:
+                    self._backend.create_veth(if_local_name, if_remote_name,
+                                              bridge)
+                    pairs.append((if_local_name, if_remote_name))
+                finally:
+                    self._busy.discard(if_local_name)
+        except Exception:
+            LOG.exception(_('Cannot fill the veth pool of bridge {0}').format(
+                bridge))
+        finally:
+            self._refilling.discard(bridge)
+
+    def claim(self, bridge):
+        """Returns a (if_local_name, if_remote_name) pair attached to
+           `bridge`, or None if none is ready.
+        """
+        if self.size <= 0:
+            return
+        pairs = self._pairs[bridge]
+        pair = pairs.popleft() if pairs else None
+        if pair:
+            self._busy.add(pair[0])
+        self.fill(bridge)
+        return pair
+
+    def release(self, if_local_name):
+        """Marks a claimed pair as moved into its container (or deleted)."""
+        self._busy.discard(if_local_name)
+
+    def drain(self):
+        for pairs in self._pairs.itervalues():
+            while pairs:
+                if_local_name, _if_remote_name = pairs.popleft()
+                self._backend.delete_veth(if_local_name)
+
+
+class GarbageCollector(object):
+    """Removes the network namespace links and the veth interfaces which
+       do not belong to any container anymore.
+    """
+
+    def __init__(self, backend, pool=None):
+        self._backend = backend
+        self._pool = pool
+
+    def _list_netns_links(self):
+        if not os.path.isdir(NETNS_PATH):
+            return []
+        # NOTE: Other services keep their namespaces here as well, only
+        # consider the ones named after a container.
+        return [name for name in os.listdir(NETNS_PATH)
+                if _CONTAINER_ID_RE.match(name)]
+
+    def _list_interfaces(self):
+        return [name for name in os.listdir(SYS_NET_PATH)
+                if name.startswith(LOCAL_PREFIX) or
+                name.startswith(VethPool.LOCAL_PREFIX)]
+
+    def _is_container_veth(self, if_local_name):
+        return (if_local_name.startswith(LOCAL_PREFIX) and
+                len(if_local_name) == len(LOCAL_PREFIX) + _ID_PREFIX_LEN)
+
+    def _is_leaked(self, if_local_name, live_prefixes, pooled):
+        if if_local_name in pooled:
+            return False
+        if self._is_container_veth(if_local_name):
+            return if_local_name[len(LOCAL_PREFIX):] not in live_prefixes
+        # NOTE: Pooled or randomly named pair: once its peer is moved into a
+        # container, the pair goes away with the container namespace. It
+        # leaked if the peer is still on the host.
+        if if_local_name.startswith(VethPool.LOCAL_PREFIX):
+            suffix = if_local_name[len(VethPool.LOCAL_PREFIX):]
+            return interface_exists(VethPool.REMOTE_PREFIX + suffix)
+        suffix = if_local_name[len(LOCAL_PREFIX):]
+        return interface_exists(REMOTE_PREFIX + suffix)
+
+    def collect(self, list_container_ids):
+        """Removes what does not belong to the containers returned by
+           `list_container_ids`. Returns the number of removed entries.
+        """
+        # NOTE: Look at the host before listing the containers, anything
+        # created in between belongs to a container which will be listed.
+        links = self._list_netns_links()
+        interfaces = self._list_interfaces()
+        live_ids = set(list_container_ids())
+        if not live_ids and (links or any(self._is_container_veth(name)
+                                          for name in interfaces)):
+            # NOTE: Containers still have a network, the listing is more
+            # likely wrong than all of them gone.
+            LOG.warning(_('No container listed while container network '
+                          'namespace links or veth interfaces exist, not '
+                          'collecting them'))
+            return 0
+        live_prefixes = set(container_id[:_ID_PREFIX_LEN]
+                            for container_id in live_ids)
+        pooled = self._pool.names() if self._pool else set()
+        removed = 0
+        for container_id in links:
+            if container_id not in live_ids:
+                remove_netns_link(container_id)
+                removed += 1
+        for if_local_name in interfaces:
+            if self._is_leaked(if_local_name, live_prefixes, pooled):
+                self._backend.delete_veth(if_local_name)
+                removed += 1
+        return removed
+
+
+_BACKENDS = {
+    'execute': ExecuteBackend,
+    'batch': IPBatchBackend,
+}
+
+
+def get_backend():
+    backend = _BACKENDS.get(CONF.docker_network_backend)
+    if backend is None:
+        msg = _('Unknown docker network backend "{0}"')
+        raise exception.NovaException(
+            msg.format(CONF.docker_network_backend))
+    return backend()
@@ -0,0 +1,156 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (c) 2013 dotCloud, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import time
+
+from oslo.config import cfg
+
+from nova.openstack.common.gettextutils import _
+from nova.openstack.common import log as logging
+from nova.virt.docker import hostinfo
+from nova.virt.docker import scheduler
+
+
+docker_prefetch_opts = [
+    cfg.ListOpt('docker_prefetch_images',
+                default=[],
+                help=_('Names of the images pulled from the registry ahead '
+                       'of their first use')),
+    cfg.IntOpt('docker_prefetch_top_images',
+               default=5,
+               help=_('Number of most launched images also pulled ahead of '
+                      'time when missing')),
+    cfg.IntOpt('docker_prefetch_interval',
+               default=0,
+               help=_('Number of seconds between two image prefetch runs, '
+                      '0 disables the prefetcher')),
+    cfg.IntOpt('docker_prefetch_launch_half_life',
+               default=3600,
+               help=_('Number of seconds after which a launch counts half '
+                      'when ranking the most launched images')),
+    cfg.IntOpt('docker_prefetch_eviction_backoff',
+               default=3600,
+               help=_('Number of seconds during which an image removed by '
+                      'the image cache manager is not prefetched again')),
+    cfg.IntOpt('docker_prefetch_max_pulls',
+               default=1,
+               help=_('Maximum number of images pulled by a prefetch run')),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(docker_prefetch_opts)
+CONF.import_opt('docker_image_cache_target_free_percent',
+                'nova.virt.docker.imagecache')
+
+LOG = logging.getLogger(__name__)
+
+
+class ImagePrefetcher(object):
+    """Pulls images before the first spawn needs them: the configured ones
+       and the most launched ones, a few at a time.
+    """
+
+    def __init__(self, docker, resolve_name, is_present,
+                 evicted_recently=None):
+        self._docker = docker
+        self._resolve_name = resolve_name
+        self._is_present = is_present
+        self._evicted_recently = evicted_recently
+        self._launches = collections.Counter()
+        self._decayed_at = time.time()
+        self._warm = set()
+
+    def _decay_launches(self):
+        # NOTE: Old launches fade away, so that images nobody launches
+        # anymore leave the most launched ones.
+        now = time.time()
+        factor = 0.5 ** ((now - self._decayed_at) /
+                         float(CONF.docker_prefetch_launch_half_life))
+        self._decayed_at = now
+        for name in self._launches.keys():
+            self._launches[name] *= factor
+            if self._launches[name] < 0.01:
+                del self._launches[name]
+
+    def record_launch(self, image_name):
+        self._decay_launches()
+        self._launches[image_name] += 1
+
+    def warm_images(self):
+        """Returns the names of the wanted images known to be present."""
+        return sorted(self._warm)
+
+    def _wanted_images(self):
+        self._decay_launches()
+        wanted = []
+        for name in CONF.docker_prefetch_images:
+            wanted.append(self._resolve_name(name))
+        for name, _count in self._launches.most_common(
+                CONF.docker_prefetch_top_images):
+            if name not in wanted:
+                wanted.append(name)
+        if self._evicted_recently is not None:
+            # NOTE: Do not pull back what the image cache manager just
+            # removed to free space.
+            backoff = CONF.docker_prefetch_eviction_backoff
+            wanted = [name for name in wanted
+                      if not self._evicted_recently(name, backoff)]
+        return wanted
+
+    def _has_free_space(self):
+        # NOTE: Do not pull images the image cache manager would have to
+        # remove right away.
+        disk = hostinfo.get_disk_usage()
+        return disk['available'] * 100 >= \
+            disk['total'] * CONF.docker_image_cache_target_free_percent
+
+    def run(self):
+        """Pulls the wanted images which are missing. Returns the names of
+           the pulled images.
+        """
+        pulled = []
+        wanted = self._wanted_images()
+        self._warm &= set(wanted)
+        for image_name in wanted:
+            if self._is_present(image_name):
+                self._warm.add(image_name)
+                continue
+            self._warm.discard(image_name)
+            if len(pulled) >= CONF.docker_prefetch_max_pulls:
+                continue
+            if not self._has_free_space():
+                LOG.warning(_('Not enough free space to prefetch '
+                              'images'))
+                break
+            LOG.info(_('Prefetching image {0}').format(image_name))
+            if self._docker.pull_repository(image_name):
+                pulled.append(image_name)
+                self._warm.add(image_name)
+            else:
+                LOG.warning(_('Cannot prefetch image {0}').format(image_name))
+        missing = len(wanted) - len(self._warm)
+        LOG.debug(_('Prefetched images: {0}, warm: {1}, still missing: '
+                    '{2}').format(pulled, self.warm_images(), missing))
+        return pulled
+
+    @scheduler.background
+    def periodic_run(self):
+        try:
+            self.run()
+        except Exception:
+            LOG.exception(_('Cannot prefetch images'))
@@ -0,0 +1,109 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (c) 2013 dotCloud, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import re
+import time
+
+
+_UNITS = {
+    'B': 1,
+    'KB': 1000,
+    'MB': 1000 ** 2,
+    'GB': 1000 ** 3,
+}
+
+# NOTE: Older docker versions only report progress as a human readable
+# string such as "[====>    ] 12.3 MB/50 MB 2s".
+_PROGRESS_RE = re.compile(r'([\d.]+)\s*([KMG]?B)/([\d.]+)\s*([KMG]?B)')
+
+
+def _parse_progress(message):
+    """Returns the (current, total) bytes of a progress message, either may
+       be None.
+    """
+    detail = message.get('progressDetail')
+    if detail and 'current' in detail:
+        return detail.get('current'), detail.get('total')
+    match = _PROGRESS_RE.search(message.get('progress') or '')
+    if match is None:
+        return None, None
+    current, current_unit, total, total_unit = match.groups()
+    try:
+        return (int(float(current) * _UNITS[current_unit]),
+                int(float(total) * _UNITS[total_unit]))
+    except ValueError:
+        return None, None
+
+
+class ProgressTracker(object):
+    """Follows the progress messages docker streams during an image pull or
+       push.
+
+    Tracks the bytes transferred per layer and the overall throughput, and
+    records the error the daemon reports in the stream (with a 200 status).
+    `callback` is called with the tracker at most every `interval` seconds
+    while bytes are transferred, and once more when the transfer ends.
+    """
+
+    def __init__(self, callback=None, interval=1):
+        self.callback = callback
+        self.interval = interval
+        self.layers = {}
+        self.status = None
+        self.error = None
+        self.started_at = time.time()
+        self.updated_at = self.started_at
+        self._reported_at = 0
+
+    @property
+    def bytes(self):
+        return sum(current for current, _total in self.layers.itervalues())
+
+    @property
+    def throughput(self):
+        """Bytes per second transferred since the beginning."""
+        elapsed = self.updated_at - self.started_at
+        if elapsed <= 0:
+            return 0
+        return self.bytes / elapsed
+
+    def update(self, message):
+        if 'error' in message:
+            detail = message.get('errorDetail') or {}
+            self.error = detail.get('message') or message['error']
+            return
+        self.status = message.get('status', self.status)
+        current, total = _parse_progress(message)
+        if current is None:
+            return
+        self.layers[message.get('id')] = (current, total)
+        self.updated_at = time.time()
+        if self.updated_at - self._reported_at >= self.interval:
+            self._report()
+
+    def finish(self):
+        self.updated_at = time.time()
+        self._report()
+
+    def _report(self):
+        self._reported_at = self.updated_at
+        if self.callback is not None:
+            self.callback(self)
+
+    def __str__(self):
+        return '{0} bytes in {1} layers at {2} bytes/s'.format(
+            self.bytes, len(self.layers), int(self.throughput))
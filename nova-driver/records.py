@@ -0,0 +1,99 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (c) 2013 dotCloud, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+def _port_mapping(network):
+    """Returns the host ports of a container as {'Tcp': {port: host_port}},
+       the PortMapping format of API versions before 1.7.
+    """
+    ports = network.get('Ports')
+    if not ports:
+        return network.get('PortMapping')
+    mapping = {'Tcp': {}, 'Udp': {}}
+    for port, bindings in ports.iteritems():
+        if not bindings:
+            continue
+        number, _sep, protocol = port.partition('/')
+        protocol = protocol.capitalize() or 'Tcp'
+        mapping.setdefault(protocol, {})[number] = \
+            bindings[0].get('HostPort')
+    return mapping
+
+
+class ContainerInfo(object):
+    """The fields of a container inspect result the driver uses.
+
+    Records are much smaller than the decoded inspect results, they can be
+    kept for every container of the host.
+    """
+
+    __slots__ = ('id', 'hostname', 'image', 'memory', 'running', 'pid',
+                 'path', 'port_mapping')
+
+    def __init__(self, container_id, hostname=None, image=None, memory=0,
+                 running=False, pid=0, path=None, port_mapping=None):
+        self.id = container_id
+        self.hostname = hostname
+        self.image = image
+        self.memory = memory
+        self.running = running
+        self.pid = pid
+        self.path = path
+        self.port_mapping = port_mapping
+
+    @classmethod
+    def from_inspect(cls, info):
+        """Returns the record of an inspect result, None if there is no
+           result.
+        """
+        if not info:
+            return
+        config = info.get('Config') or {}
+        state = info.get('State') or {}
+        network = info.get('NetworkSettings') or {}
+        return cls(info['id'],
+                   hostname=config.get('Hostname'),
+                   image=config.get('Image'),
+                   memory=config.get('Memory') or 0,
+                   running=bool(state.get('Running')),
+                   pid=state.get('Pid') or 0,
+                   path=info.get('Path'),
+                   port_mapping=_port_mapping(network))
+
+    def __repr__(self):
+        return '<ContainerInfo {0} hostname={1} running={2}>'.format(
+            self.id, self.hostname, self.running)
+
+
+class ImageInfo(object):
+    """The fields of an image inspect result the driver uses."""
+
+    __slots__ = ('id', 'cmd')
+
+    def __init__(self, image_id, cmd=None):
+        self.id = image_id
+        self.cmd = cmd
+
+    @classmethod
+    def from_inspect(cls, info):
+        if not info:
+            return
+        config = info.get('container_config') or {}
+        return cls(info.get('id'), cmd=config.get('Cmd'))
+
+    def __repr__(self):
+        return '<ImageInfo {0}>'.format(self.id)
@@ -0,0 +1,133 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (c) 2013 dotCloud, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import errno
+import random
+import socket
+import time
+
+from oslo.config import cfg
+
+from nova.openstack.common.gettextutils import _
+from nova.openstack.common import log as logging
+
+
+docker_retry_opts = [
+    cfg.IntOpt('docker_request_retries',
+               default=3,
+               help=_('Number of times a request to the docker daemon is '
+                      'retried after a connection failure')),
+    cfg.FloatOpt('docker_retry_initial_delay',
+                 default=0.2,
+                 help=_('Maximum number of seconds to wait before the first '
+                        'retry, doubled for every following one')),
+    cfg.FloatOpt('docker_retry_max_delay',
+                 default=5.0,
+                 help=_('Maximum number of seconds to wait before a retry')),
+    cfg.IntOpt('docker_breaker_failure_threshold',
+               default=5,
+               help=_('Number of consecutive connection failures after '
+                      'which the docker daemon is considered down and '
+                      'requests fail immediately')),
+    cfg.IntOpt('docker_breaker_reset_timeout',
+               default=10,
+               help=_('Number of seconds between two checks of whether a '
+                      'docker daemon considered down is back')),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(docker_retry_opts)
+
+LOG = logging.getLogger(__name__)
+
+# NOTE: Errors raised before the request reached the daemon, the request
+# can be sent again whatever it does.
+CONNECT_ERRNOS = (errno.ECONNREFUSED, errno.ENOENT, errno.EAGAIN)
+
+
+class DaemonUnavailable(socket.error):
+    """The docker daemon is considered down, the request was not sent."""
+
+
+def is_connect_error(e):
+    return (isinstance(e, socket.error) and
+            not isinstance(e, DaemonUnavailable) and
+            e.errno in CONNECT_ERRNOS)
+
+
+def backoff_delay(attempt, initial_delay=None, max_delay=None):
+    """Returns the number of seconds to wait before retry number `attempt`
+       (starting at 0): random, up to an exponentially growing bound, so
+       that the callers do not all retry at the same time.
+    """
+    if initial_delay is None:
+        initial_delay = CONF.docker_retry_initial_delay
+    if max_delay is None:
+        max_delay = CONF.docker_retry_max_delay
+    return random.uniform(0, min(max_delay, initial_delay * 2 ** attempt))
+
+
+class CircuitBreaker(object):
+    """Fails requests fast while the docker daemon is known to be down.
+
+    After `threshold` consecutive failures the breaker opens: requests are
+    refused with DaemonUnavailable. Every `reset_timeout` seconds, the next
+    request first calls `probe` (a cheap check raising socket.error while
+    the daemon is down) and the breaker closes again if it succeeds.
+    """
+
+    def __init__(self, probe, threshold=None, reset_timeout=None):
+        if threshold is None:
+            threshold = CONF.docker_breaker_failure_threshold
+        if reset_timeout is None:
+            reset_timeout = CONF.docker_breaker_reset_timeout
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._probe = probe
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def check(self):
+        """Raises DaemonUnavailable if requests must not be sent."""
+        if self.opened_at is None:
+            return
+        if time.time() - self.opened_at < self.reset_timeout:
+            raise DaemonUnavailable(_('Docker daemon is unavailable'))
+        # NOTE: Only one caller probes, the others keep failing fast
+        self.opened_at = time.time()
+        try:
+            self._probe()
+        except socket.error as e:
+            raise DaemonUnavailable(
+                _('Docker daemon is still unavailable: {0}').format(e))
+        LOG.info(_('Docker daemon is available again'))
+        self.record_success()
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.opened_at is None and self.failures >= self.threshold > 0:
+            LOG.warning(_('Docker daemon considered unavailable after {0} '
+                          'failures').format(self.failures))
+            self.opened_at = time.time()
@@ -0,0 +1,161 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (c) 2013 dotCloud, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import contextlib
+import functools
+import time
+
+from eventlet import corolocal
+from eventlet import event
+from oslo.config import cfg
+
+from nova.openstack.common.gettextutils import _
+
+
+docker_scheduler_opts = [
+    cfg.IntOpt('docker_interactive_concurrency',
+               default=10,
+               help=_('Maximum number of requests of instance lifecycle '
+                      'operations sent to the docker daemon at the same '
+                      'time')),
+    cfg.IntOpt('docker_background_concurrency',
+               default=4,
+               help=_('Maximum number of requests of periodic inventory '
+                      'tasks sent to the docker daemon at the same time')),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(docker_scheduler_opts)
+
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+
+# NOTE: Highest priority first
+PRIORITIES = (INTERACTIVE, BACKGROUND)
+
+_local = corolocal.local()
+
+
+def current_priority():
+    """Returns the priority of the requests of the current green thread."""
+    return getattr(_local, 'priority', INTERACTIVE)
+
+
+@contextlib.contextmanager
+def priority(value):
+    """Sends the requests of the current green thread with priority
+       `value` within the block.
+    """
+    previous = current_priority()
+    _local.priority = value
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+def background(f):
+    """Decorator sending the requests of `f` with the background
+       priority.
+    """
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        with priority(BACKGROUND):
+            return f(*args, **kwargs)
+    return wrapper
+
+
+class RequestScheduler(object):
+    """Hands out the right to send a request to the docker daemon.
+
+    At most `max_active` requests run at the same time, and at most
+    limits[priority] of each priority. When a request ends, the waiting
+    requests are resumed highest priority first, in arrival order within a
+    priority. The time spent waiting is recorded per priority in `stats`.
+    """
+
+    def __init__(self, max_active, limits=None):
+        if limits is None:
+            limits = {
+                INTERACTIVE: CONF.docker_interactive_concurrency,
+                BACKGROUND: CONF.docker_background_concurrency,
+            }
+        self.max_active = max_active
+        self.limits = limits
+        self._active = collections.Counter()
+        self._waiters = dict((p, collections.deque()) for p in PRIORITIES)
+        self.stats = dict((p, {'requests': 0,
+                               'queued': 0,
+                               'queue_time': 0.0,
+                               'max_queue_time': 0.0}) for p in PRIORITIES)
+
+    def _can_run(self, priority):
+        return (sum(self._active.values()) < self.max_active and
+                self._active[priority] < max(self.limits[priority], 1))
+
+    def _waiting_before(self, priority):
+        for p in PRIORITIES:
+            if self._waiters[p]:
+                return True
+            if p == priority:
+                return False
+
+    def acquire(self, priority=None):
+        """Waits for the right to send a request, returns the priority to
+           give back to `release`.
+        """
+        if priority is None:
+            priority = current_priority()
+        stats = self.stats[priority]
+        stats['requests'] += 1
+        if self._can_run(priority) and not self._waiting_before(priority):
+            self._active[priority] += 1
+            return priority
+        stats['queued'] += 1
+        waiter = event.Event()
+        self._waiters[priority].append(waiter)
+        started = time.time()
+        try:
+            waiter.wait()
+        except BaseException:
+            if waiter in self._waiters[priority]:
+                self._waiters[priority].remove(waiter)
+            else:
+                # NOTE: The slot was handed over before the wait ended
+                self.release(priority)
+            raise
+        waited = time.time() - started
+        stats['queue_time'] += waited
+        stats['max_queue_time'] = max(stats['max_queue_time'], waited)
+        return priority
+
+    def release(self, priority):
+        self._active[priority] -= 1
+        for p in PRIORITIES:
+            waiters = self._waiters[p]
+            while waiters and self._can_run(p):
+                self._active[p] += 1
+                waiters.popleft().send()
+
+    @contextlib.contextmanager
+    def request(self, priority=None):
+        priority = self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release(priority)
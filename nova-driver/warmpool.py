@@ -0,0 +1,196 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (c) 2013 dotCloud, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import errno
+import os
+import uuid
+
+import eventlet
+from oslo.config import cfg
+
+from nova.openstack.common.gettextutils import _
+from nova.openstack.common import jsonutils
+from nova.openstack.common import log as logging
+from nova.virt.docker import scheduler
+
+
+docker_warm_pool_opts = [
+    cfg.IntOpt('docker_warm_pool_size',
+               default=0,
+               help=_('Number of containers created ahead of time for each '
+                      'of the most launched image and memory limit '
+                      'combinations. 0 disables the warm pool. It is only '
+                      'used with the lxc execution driver of docker, and '
+                      'the /etc/hostname and /etc/hosts files of claimed '
+                      'containers keep a placeholder hostname')),
+    cfg.IntOpt('docker_warm_pool_max_images',
+               default=3,
+               help=_('Number of most launched image and memory limit '
+                      'combinations kept warm')),
+    cfg.StrOpt('docker_warm_pool_claims_file',
+               default='$state_path/docker-warm-claims.json',
+               help=_('File recording the instance names of the claimed '
+                      'warm containers')),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(docker_warm_pool_opts)
+CONF.import_opt('state_path', 'nova.paths')
+
+LOG = logging.getLogger(__name__)
+
+WARM_HOSTNAME_PREFIX = 'docker-warm-'
+
+
+def is_warm_name(name):
+    return (name or '').startswith(WARM_HOSTNAME_PREFIX)
+
+
+class WarmPool(object):
+    """Keeps stopped containers created ahead of time for the most launched
+       (image name, memory limit) combinations, so that a spawn only has to
+       start one of them.
+
+    Docker cannot change the hostname of a created container: claimed
+    containers are started with their lxc.utsname set to the instance name,
+    which only the lxc execution driver applies. Their /etc/hostname and
+    /etc/hosts still name the placeholder hostname. The instance name of
+    every claimed container is recorded in `claims` (persisted in
+    docker_warm_pool_claims_file) since it cannot be read back from the
+    container config.
+    """
+
+    def __init__(self, docker, make_args, size=None, max_images=None,
+                 claims_file=None):
+        if size is None:
+            size = CONF.docker_warm_pool_size
+        if max_images is None:
+            max_images = CONF.docker_warm_pool_max_images
+        if claims_file is None:
+            claims_file = CONF.docker_warm_pool_claims_file
+        self.size = size
+        self.max_images = max_images
+        self._docker = docker
+        self._make_args = make_args
+        self._claims_file = claims_file
+        self._launches = collections.Counter()
+        self._pools = collections.defaultdict(collections.deque)
+        self._refilling = set()
+        self._claims_lost = False
+        self.claims = self._load_claims()
+
+    @property
+    def enabled(self):
+        return self.size > 0
+
+    def _load_claims(self):
+        try:
+            with open(self._claims_file) as f:
+                return jsonutils.loads(f.read())
+        except IOError as e:
+            if e.errno == errno.ENOENT:
+                return {}
+        except ValueError:
+            pass
+        # NOTE: Without the claims, the warm containers of a previous run
+        # cannot be told from the ones given to instances.
+        LOG.error(_('Cannot read the warm pool claims file {0}, the warm '
+                    'containers left by a previous run are not '
+                    'reused').format(self._claims_file))
+        self._claims_lost = True
+        return {}
+
+    def _save_claims(self):
+        tmp_path = self._claims_file + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(jsonutils.dumps(self.claims))
+        os.rename(tmp_path, self._claims_file)
+
+    def _warm_keys(self):
+        return [key for key, _count
+                in self._launches.most_common(self.max_images)]
+
+    def adopt(self, infos):
+        """Puts back in the pool the unclaimed warm containers found in
+           `infos` (records.ContainerInfo), left by a previous run. Nothing
+           is adopted if the claims file could not be read.
+        """
+        if self._claims_lost:
+            return
+        for info in infos:
+            # NOTE: A running warm container was claimed, even if its claim
+            # was not recorded.
+            if not info or info.running or info.id in self.claims:
+                continue
+            if not is_warm_name(info.hostname):
+                continue
+            key = (info.image, info.memory)
+            self._pools[key].append(info.id)
+
+    def record_launch(self, image_name, memory):
+        if not self.enabled:
+            return
+        key = (image_name, memory)
+        self._launches[key] += 1
+        self.fill(key)
+
+    def fill(self, key):
+        if key in self._refilling or key not in self._warm_keys():
+            return
+        self._refilling.add(key)
+        eventlet.spawn_n(self._refill, key)
+
+    @scheduler.background
+    def _refill(self, key):
+        image_name, memory = key
+        pool = self._pools[key]
+        try:
+            while len(pool) < self.size:
+                args = self._make_args(image_name, memory)
+                args['Hostname'] = WARM_HOSTNAME_PREFIX + \
+                    uuid.uuid4().hex[:12]
+                container_id = self._docker.create_container(
+                    args, name=args['Hostname'])
+                if not container_id:
+                    # NOTE: The image is not there yet, the first spawn will
+                    # pull it.
+                    break
+                pool.append(container_id)
+        except Exception:
+            LOG.exception(_('Cannot fill the warm pool of image '
+                            '{0}').format(image_name))
+        finally:
+            self._refilling.discard(key)
+
+    def claim(self, image_name, memory, name):
+        """Returns the id of a created container for `image_name` and
+           `memory` now belonging to instance `name`, or None.
+        """
+        key = (image_name, memory)
+        pool = self._pools.get(key)
+        if not pool:
+            return
+        container_id = pool.popleft()
+        self.claims[container_id] = name
+        self._save_claims()
+        self.fill(key)
+        return container_id
+
+    def forget(self, container_id):
+        if self.claims.pop(container_id, None) is not None:
+            self._save_claims()
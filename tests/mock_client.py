@@ -15,6 +15,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import random
 import time
 import uuid
 
@@ -35,9 +36,10 @@ class MockClient(object):
     @nova.virt.docker.client.filter_data
     def list_containers(self, _all=True):
         containers = []
-        for container_id in self._containers.iterkeys():
+        for container_id, container in self._containers.iteritems():
+            status = 'Up 2 seconds' if container['running'] else 'Exit 0'
             containers.append({
-                'Status': 'Exit 0',
+                'Status': status,
                 'Created': int(time.time()),
                 'Image': 'ubuntu:12.04',
                 'Ports': '',
@@ -46,7 +48,13 @@ class MockClient(object):
             })
         return containers
 
-    def create_container(self, args):
+    def iter_containers(self, _all=True, page_size=None):
+        return iter(self.list_containers(_all))
+
+    def supports(self, feature):
+        return False
+
+    def create_container(self, args, name=None):
         data = {
             'Hostname': '',
             'User': '',
@@ -71,16 +79,24 @@ class MockClient(object):
         self._containers[container_id] = {
             'id': container_id,
             'running': False,
+            'pid': random.randint(2, 32768),
             'config': args
         }
         return container_id
 
-    def start_container(self, container_id):
+    def start_container(self, container_id, lxc_conf=None):
         if container_id not in self._containers:
             return False
         self._containers[container_id]['running'] = True
         return True
 
+    @nova.virt.docker.client.filter_data
+    def list_images(self):
+        return []
+
+    def delete_image(self, image_name):
+        return True
+
     @nova.virt.docker.client.filter_data
     def inspect_image(self, image_name):
         return {'container_config': {'Cmd': None}}
@@ -108,7 +124,7 @@ class MockClient(object):
             'State': {
                 'ExitCode': 0,
                 'Ghost': False,
-                'Pid': 0,
+                'Pid': container['pid'] if container['running'] else 0,
                 'Running': container['running'],
                 'StartedAt': str(timeutils.utcnow())
             },
@@ -117,6 +133,13 @@ class MockClient(object):
         }
         return info
 
+    def iter_inspect_containers(self, container_ids, concurrency=None):
+        for container_id in container_ids:
+            yield container_id, self.inspect_container(container_id)
+
+    def inspect_containers(self, container_ids, concurrency=None):
+        return dict(self.iter_inspect_containers(container_ids))
+
     def stop_container(self, container_id, timeout=None):
         if container_id not in self._containers:
             return False
@@ -129,10 +152,10 @@ class MockClient(object):
         del self._containers[container_id]
         return True
 
-    def pull_repository(self, name):
+    def pull_repository(self, name, callback=None):
         return True
 
-    def push_repository(self, name, headers=None):
+    def push_repository(self, name, headers=None, callback=None):
         return True
 
     def commit_container(self, container_id, name):
@@ -140,7 +163,19 @@ class MockClient(object):
             return False
         return True
 
-    def get_container_logs(self, container_id):
+    def get_info(self):
+        return {'Containers': len(self._containers)}
+
+    def get_events(self):
+        return
+
+    def handle_event(self, event):
+        pass
+
+    def clear_cache(self):
+        pass
+
+    def get_container_logs(self, container_id, max_bytes=None):
         if container_id not in self._containers:
             return False
         return '\n'.join([
@@ -0,0 +1,61 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (c) 2013 dotCloud, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import time
+
+from nova import test
+from nova.virt.docker import cache
+
+
+class LRUCacheTestCase(test.TestCase):
+
+    def test_get(self):
+        lru = cache.LRUCache(2)
+        lru.put('foo', 1)
+        self.assertEqual(1, lru.get('foo'))
+        self.assertEqual(None, lru.get('bar'))
+        self.assertEqual(1, lru.hits)
+        self.assertEqual(1, lru.misses)
+
+    def test_evict_least_recently_used(self):
+        lru = cache.LRUCache(2)
+        lru.put('foo', 1)
+        lru.put('bar', 2)
+        lru.get('foo')
+        lru.put('baz', 3)
+        self.assertEqual(2, len(lru))
+        self.assertTrue('foo' in lru)
+        self.assertFalse('bar' in lru)
+
+    def test_disabled(self):
+        lru = cache.LRUCache(0)
+        lru.put('foo', 1)
+        self.assertEqual(0, len(lru))
+
+    def test_ttl(self):
+        lru = cache.LRUCache(2)
+        now = time.time()
+        self.stubs.Set(time, 'time', lambda: now)
+        lru.put('foo', 1, ttl=10)
+        lru.put('bar', 2)
+        self.assertEqual(1, lru.get('foo'))
+        now += 10
+        self.assertEqual(None, lru.get('foo'))
+        self.assertFalse('foo' in lru)
+        self.assertEqual(2, lru.get('bar'))
+        self.assertEqual(2, lru.hits)
+        self.assertEqual(1, lru.misses)
@@ -15,10 +15,17 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import errno
+import socket
+import StringIO
+
+import eventlet
 import mox
 
+from nova import exception
 from nova import test
 import nova.virt.docker.client
+import nova.virt.docker.retry
 from nova.openstack.common import jsonutils
 
 
@@ -29,14 +36,209 @@ class FakeResponse(object):
         self._headers = headers or {}
 
     def read(self, _size=None):
-        return self._data
+        data, self._data = self._data, ''
+        return data
 
     def getheader(self, key):
         return self._headers.get(key)
 
 
+class FakeStreamResponse(FakeResponse):
+    def __init__(self, status, data='', headers=None):
+        super(FakeStreamResponse, self).__init__(status, data, headers)
+        self._stream = StringIO.StringIO(data)
+
+    def read(self, size=None):
+        if size is None:
+            return self._stream.read()
+        return self._stream.read(size)
+
+
+class FakeChunkedResponse(FakeResponse):
+    chunked = True
+
+    def __init__(self, status, chunks, headers=None):
+        super(FakeChunkedResponse, self).__init__(status, '', headers)
+        self._chunks = list(chunks)
+        self.reads = []
+
+    @property
+    def chunk_left(self):
+        if self._chunks:
+            return len(self._chunks[0])
+
+    def read(self, size=None):
+        self.reads.append(size)
+        if not self._chunks:
+            return ''
+        data = self._chunks[0][:size]
+        self._chunks[0] = self._chunks[0][len(data):]
+        if not self._chunks[0]:
+            self._chunks.pop(0)
+        return data
+
+
+class FakeConnection(object):
+    def __init__(self, response=None):
+        self.sock = None
+        self.closed = False
+        self.requests = []
+        self._response = response
+
+    def request(self, *args, **kwargs):
+        self.requests.append(args)
+
+    def getresponse(self):
+        return self._response
+
+    def close(self):
+        self.closed = True
+
+
+class UnixHTTPConnectionPoolTestCase(test.TestCase):
+
+    def setUp(self):
+        super(UnixHTTPConnectionPoolTestCase, self).setUp()
+        self.flags(docker_api_version='1.4')
+
+    def test_reuse_idle_connection(self):
+        pool = nova.virt.docker.client.UnixHTTPConnectionPool(
+            max_size=2, idle_timeout=60)
+        conn = FakeConnection()
+        self.stubs.Set(pool, '_create', lambda: conn)
+        pool.put(pool.get())
+        self.stubs.Set(pool, '_create', FakeConnection)
+        self.assertIs(conn, pool.get())
+        self.assertFalse(conn.closed)
+
+    def test_discard_connection(self):
+        pool = nova.virt.docker.client.UnixHTTPConnectionPool(
+            max_size=2, idle_timeout=60)
+        conn = FakeConnection()
+        self.stubs.Set(pool, '_create', lambda: conn)
+        pool.put(pool.get(), discard=True)
+        self.assertTrue(conn.closed)
+        self.stubs.Set(pool, '_create', FakeConnection)
+        self.assertIsNot(conn, pool.get())
+
+    def test_evict_idle_connection(self):
+        pool = nova.virt.docker.client.UnixHTTPConnectionPool(
+            max_size=2, idle_timeout=-1)
+        conn = FakeConnection()
+        self.stubs.Set(pool, '_create', lambda: conn)
+        pool.put(pool.get())
+        self.assertTrue(conn.closed)
+
+    def test_make_request_releases_connection(self):
+        response = FakeResponse(200, data='[]',
+                                headers={'Content-Type': 'application/json'})
+        response.will_close = False
+        conn = FakeConnection(response)
+        client = nova.virt.docker.client.DockerHTTPClient()
+        self.stubs.Set(client.pool, '_create', lambda: conn)
+        self.assertEqual([], client.list_containers())
+        self.assertEqual([], client.list_containers())
+        self.assertEqual(2, len(conn.requests))
+        self.assertEqual(1, len(client.pool._idle))
+
+
+class SingleFlightTestCase(test.TestCase):
+
+    def test_do(self):
+        flight = nova.virt.docker.client.SingleFlight()
+        calls = []
+
+        def _call():
+            calls.append(None)
+            eventlet.sleep(0)
+            return 42
+
+        threads = [eventlet.spawn(flight.do, 'key', _call) for _i in range(3)]
+        self.assertEqual([42, 42, 42], [t.wait() for t in threads])
+        self.assertEqual(1, len(calls))
+        self.assertEqual(2, flight.coalesced)
+        self.assertEqual(42, flight.do('key', _call))
+        self.assertEqual(2, len(calls))
+
+    def test_do_exception(self):
+        flight = nova.virt.docker.client.SingleFlight()
+
+        def _call():
+            eventlet.sleep(0)
+            raise ValueError()
+
+        threads = [eventlet.spawn(flight.do, 'key', _call) for _i in range(2)]
+        for thread in threads:
+            self.assertRaises(ValueError, thread.wait)
+        self.assertEqual(1, flight.coalesced)
+
+    def test_forget(self):
+        flight = nova.virt.docker.client.SingleFlight()
+        calls = []
+
+        def _call(value):
+            calls.append(value)
+            eventlet.sleep(0)
+            return value
+
+        first = eventlet.spawn(flight.do, 'key', _call, 1)
+        eventlet.sleep(0)
+        flight.forget(lambda key: key == 'key')
+        second = eventlet.spawn(flight.do, 'key', _call, 2)
+        self.assertEqual(1, first.wait())
+        self.assertEqual(2, second.wait())
+        self.assertEqual([1, 2], calls)
+        self.assertEqual(0, flight.coalesced)
+
+    def test_coalesce_identical_gets(self):
+        self.flags(docker_api_version='1.4')
+        response = FakeResponse(200, data='{"id": "XXX"}',
+                                headers={'Content-Type': 'application/json'})
+        connection = FakeConnection(response)
+
+        def _request(*args, **kwargs):
+            connection.requests.append(args)
+            eventlet.sleep(0)
+
+        connection.request = _request
+        client = nova.virt.docker.client.DockerHTTPClient(connection)
+        threads = [eventlet.spawn(client.inspect_container, 'XXX')
+                   for _i in range(3)]
+        for thread in threads:
+            self.assertEqual('XXX', thread.wait()['id'])
+        self.assertEqual(1, len(connection.requests))
+        self.assertEqual(2, client.coalesced_requests)
+
+    def test_invalidation_detaches_in_flight_gets(self):
+        self.flags(docker_api_version='1.4')
+        connection = FakeConnection()
+
+        def _request(*args, **kwargs):
+            connection.requests.append(args)
+            eventlet.sleep(0)
+
+        connection.request = _request
+        connection.getresponse = lambda: FakeResponse(
+            200, data='{"id": "XXX"}',
+            headers={'Content-Type': 'application/json'})
+        client = nova.virt.docker.client.DockerHTTPClient(connection)
+        first = eventlet.spawn(client.inspect_container, 'XXX')
+        eventlet.sleep(0)
+        # NOTE: The container started while it was being inspected
+        client.handle_event({'status': 'start', 'id': 'XXX'})
+        second = eventlet.spawn(client.inspect_container, 'XXX')
+        self.assertEqual('XXX', first.wait()['id'])
+        self.assertEqual('XXX', second.wait()['id'])
+        self.assertEqual(2, len(connection.requests))
+        self.assertEqual(0, client.coalesced_requests)
+
+
 class DockerHTTPClientTestCase(test.TestCase):
 
+    def setUp(self):
+        super(DockerHTTPClientTestCase, self).setUp()
+        self.flags(docker_api_version='1.4')
+
     def test_list_containers(self):
         mock_conn = self.mox.CreateMockAnything()
 
@@ -482,3 +684,566 @@ class DockerHTTPClientTestCase(test.TestCase):
         self.assertEqual(None, logs)
 
         self.mox.VerifyAll()
+
+    def test_get_container_logs_max_bytes(self):
+        mock_conn = self.mox.CreateMockAnything()
+
+        url = '/v1.4/containers/XXX/attach?logs=1&stream=0&stdout=1&stderr=1'
+        mock_conn.request('POST', url,
+                          headers={'Content-Type': 'application/json'})
+        response = FakeStreamResponse(200, data='ping pong')
+        mock_conn.getresponse().AndReturn(response)
+
+        self.mox.ReplayAll()
+
+        client = nova.virt.docker.client.DockerHTTPClient(mock_conn)
+        logs = client.get_container_logs('XXX', max_bytes=4)
+        self.assertEqual('pong', logs)
+
+        self.mox.VerifyAll()
+
+    def test_get_container_logs_no_bytes(self):
+        client = nova.virt.docker.client.DockerHTTPClient(FakeConnection())
+        self.assertRaises(ValueError, client.get_container_logs, 'XXX',
+                          max_bytes=0)
+
+    def test_get_events(self):
+        mock_conn = self.mox.CreateMockAnything()
+
+        mock_conn.request('GET', '/v1.4/events',
+                          headers={'Content-Type': 'application/json'})
+        data = ('{"status": "create", "id": "XXX"}\n'
+                '{"status": "start", "id": "XXX"}')
+        response = FakeStreamResponse(200, data=data,
+                                      headers={'Content-Type':
+                                               'application/json'})
+        mock_conn.getresponse().AndReturn(response)
+        mock_conn.close()
+
+        self.mox.ReplayAll()
+
+        client = nova.virt.docker.client.DockerHTTPClient(mock_conn)
+        events = list(client.get_events())
+        self.assertEqual([{'status': 'create', 'id': 'XXX'},
+                          {'status': 'start', 'id': 'XXX'}], events)
+
+        self.mox.VerifyAll()
+
+    def test_get_events_bad_return_code(self):
+        mock_conn = self.mox.CreateMockAnything()
+
+        mock_conn.request('GET', '/v1.4/events',
+                          headers={'Content-Type': 'application/json'})
+        response = FakeResponse(404)
+        mock_conn.getresponse().AndReturn(response)
+        mock_conn.close()
+
+        self.mox.ReplayAll()
+
+        client = nova.virt.docker.client.DockerHTTPClient(mock_conn)
+        self.assertEqual(None, client.get_events())
+
+        self.mox.VerifyAll()
+
+    def test_inspect_containers(self):
+        mock_conn = self.mox.CreateMockAnything()
+
+        for container_id in ('XXX', 'YYY'):
+            mock_conn.request('GET',
+                              '/v1.4/containers/{0}/json'.format(container_id),
+                              headers={'Content-Type': 'application/json'})
+            data = '{{"id": "{0}"}}'.format(container_id)
+            response = FakeResponse(200, data=data,
+                                    headers={'Content-Type':
+                                             'application/json'})
+            mock_conn.getresponse().AndReturn(response)
+        mock_conn.request('GET', '/v1.4/containers/ZZZ/json',
+                          headers={'Content-Type': 'application/json'})
+        mock_conn.getresponse().AndReturn(FakeResponse(404))
+
+        self.mox.ReplayAll()
+
+        client = nova.virt.docker.client.DockerHTTPClient(mock_conn)
+        containers = client.inspect_containers(['XXX', 'YYY', 'ZZZ'],
+                                               concurrency=2)
+        self.assertEqual({'XXX': {'id': 'XXX'},
+                          'YYY': {'id': 'YYY'},
+                          'ZZZ': None}, containers)
+
+        self.mox.VerifyAll()
+
+    def test_iter_containers_pages(self):
+        mock_conn = self.mox.CreateMockAnything()
+
+        mock_conn.request('GET', '/v1.4/containers/ps?all=1&limit=2',
+                          headers={'Content-Type': 'application/json'})
+        data = ('[{"Id": "aaaaaaaaaaaaaaaa", "Status": "Up 1 second"}, '
+                '{"Id": "bbbbbbbbbbbbbbbb", "Status": "Exit 0"}]')
+        response = FakeResponse(200, data=data,
+                                headers={'Content-Type': 'application/json'})
+        mock_conn.getresponse().AndReturn(response)
+        url = '/v1.4/containers/ps?all=1&limit=2&before=bbbbbbbbbbbb'
+        mock_conn.request('GET', url,
+                          headers={'Content-Type': 'application/json'})
+        data = '[{"Id": "cccccccccccccccc", "Status": "Up 2 seconds"}]'
+        response = FakeResponse(200, data=data,
+                                headers={'Content-Type': 'application/json'})
+        mock_conn.getresponse().AndReturn(response)
+
+        self.mox.ReplayAll()
+
+        client = nova.virt.docker.client.DockerHTTPClient(mock_conn)
+        containers = client.iter_containers(page_size=2)
+        self.assertEqual(['aaaaaaaaaaaaaaaa', 'bbbbbbbbbbbbbbbb',
+                          'cccccccccccccccc'],
+                         [c['id'] for c in containers])
+
+        self.mox.VerifyAll()
+
+    def test_iter_containers_failed_page(self):
+        mock_conn = self.mox.CreateMockAnything()
+
+        mock_conn.request('GET', '/v1.4/containers/ps?all=1&limit=1',
+                          headers={'Content-Type': 'application/json'})
+        response = FakeResponse(200, data='[{"Id": "aaaaaaaaaaaaaaaa"}]',
+                                headers={'Content-Type': 'application/json'})
+        mock_conn.getresponse().AndReturn(response)
+        url = '/v1.4/containers/ps?all=1&limit=1&before=aaaaaaaaaaaa'
+        mock_conn.request('GET', url,
+                          headers={'Content-Type': 'application/json'})
+        mock_conn.getresponse().AndReturn(FakeResponse(500))
+
+        self.mox.ReplayAll()
+
+        client = nova.virt.docker.client.DockerHTTPClient(mock_conn)
+        self.assertRaises(exception.NovaException, list,
+                          client.iter_containers(page_size=1))
+
+        self.mox.VerifyAll()
+
+    def test_iter_containers_running_only(self):
+        mock_conn = self.mox.CreateMockAnything()
+
+        mock_conn.request('GET', '/v1.4/containers/ps?all=0&limit=50',
+                          headers={'Content-Type': 'application/json'})
+        data = ('[{"Id": "XXX", "Status": "Up 1 second"}, '
+                '{"Id": "YYY", "Status": "Exit 0"}]')
+        response = FakeResponse(200, data=data,
+                                headers={'Content-Type': 'application/json'})
+        mock_conn.getresponse().AndReturn(response)
+
+        self.mox.ReplayAll()
+
+        client = nova.virt.docker.client.DockerHTTPClient(mock_conn)
+        containers = client.list_containers(_all=False)
+        self.assertEqual(['XXX'], [c['id'] for c in containers])
+
+        self.mox.VerifyAll()
+
+    def test_list_images(self):
+        mock_conn = self.mox.CreateMockAnything()
+
+        mock_conn.request('GET', '/v1.4/images/json?all=0',
+                          headers={'Content-Type': 'application/json'})
+        data = '[{"Repository": "ping", "Tag": "latest", "Id": "XXX"}]'
+        response = FakeResponse(200, data=data,
+                                headers={'Content-Type': 'application/json'})
+        mock_conn.getresponse().AndReturn(response)
+
+        self.mox.ReplayAll()
+
+        client = nova.virt.docker.client.DockerHTTPClient(mock_conn)
+        images = client.list_images()
+        self.assertEqual('XXX', images[0]['id'])
+
+        self.mox.VerifyAll()
+
+    def test_delete_image(self):
+        mock_conn = self.mox.CreateMockAnything()
+
+        mock_conn.request('DELETE', '/v1.4/images/ping:latest',
+                          headers={'Content-Type': 'application/json'})
+        response = FakeResponse(200, data='[{"Untagged": "XXX"}]',
+                                headers={'Content-Type': 'application/json'})
+        mock_conn.getresponse().AndReturn(response)
+
+        self.mox.ReplayAll()
+
+        client = nova.virt.docker.client.DockerHTTPClient(mock_conn)
+        self.assertEqual(True, client.delete_image('ping:latest'))
+
+        self.mox.VerifyAll()
+
+    def test_pull_repository_registry_port(self):
+        mock_conn = self.mox.CreateMockAnything()
+
+        url = '/v1.4/images/create?fromImage=10.0.0.1:5042/ping'
+        mock_conn.request('POST', url,
+                          headers={'Content-Type': 'application/json'})
+        response = FakeResponse(200,
+                                headers={'Content-Type': 'application/json'})
+        mock_conn.getresponse().AndReturn(response)
+
+        self.mox.ReplayAll()
+
+        client = nova.virt.docker.client.DockerHTTPClient(mock_conn)
+        self.assertEqual(True, client.pull_repository('10.0.0.1:5042/ping'))
+
+        self.mox.VerifyAll()
+
+    def test_pull_repository_error_in_stream(self):
+        mock_conn = self.mox.CreateMockAnything()
+
+        mock_conn.request('POST', '/v1.4/images/create?fromImage=ping',
+                          headers={'Content-Type': 'application/json'})
+        data = ('{"status": "Pulling", "id": "aaa"}'
+                '{"error": "Oops", "errorDetail": {"message": "Oops"}}')
+        response = FakeStreamResponse(
+            200, data=data, headers={'Content-Type': 'application/json'})
+        mock_conn.getresponse().AndReturn(response)
+
+        self.mox.ReplayAll()
+
+        client = nova.virt.docker.client.DockerHTTPClient(mock_conn)
+        self.assertEqual(False, client.pull_repository('ping'))
+
+        self.mox.VerifyAll()
+
+    def test_push_repository_progress(self):
+        data = ('{"status": "Pushing", "id": "aaa",'
+                ' "progressDetail": {"current": 10, "total": 20}}'
+                '{"status": "Pushing", "id": "aaa",'
+                ' "progressDetail": {"current": 20, "total": 20}}')
+        response = FakeStreamResponse(
+            200, data=data, headers={'Content-Type': 'application/json'})
+        conn = FakeConnection(response)
+        client = nova.virt.docker.client.DockerHTTPClient()
+        self.stubs.Set(nova.virt.docker.client, 'UnixHTTPConnection',
+                       lambda: conn)
+        reports = []
+        active = []
+
+        def _callback(tracker):
+            active.append(sum(client.scheduler._active.values()))
+            reports.append(tracker)
+
+        self.assertEqual(True, client.push_repository(
+            'ping', callback=_callback))
+        self.assertEqual(20, reports[-1].bytes)
+        # NOTE: The scheduler slot is given back once the headers arrived
+        self.assertEqual(set([0]), set(active))
+        # NOTE: The transfer has its own connection, closed once done
+        self.assertEqual(0, len(client.pool._idle))
+        self.assertTrue(conn.closed)
+
+    def test_response_decodes_json_once(self):
+        loads = []
+        self.stubs.Set(nova.virt.docker.client, 'loads',
+                       lambda data: loads.append(data) or
+                       nova.virt.docker.client.CaseInsensitiveDict(
+                           {'id': 'XXX'}))
+        response = nova.virt.docker.client.Response(FakeResponse(
+            200, data='{"Id": "XXX"}',
+            headers={'Content-Type': 'application/json'}))
+        self.assertEqual([], loads)
+        self.assertEqual('XXX', response.json['id'])
+        self.assertEqual('XXX', response.json['Id'])
+        self.assertEqual(1, len(loads))
+
+    def test_response_skip_body(self):
+        http_response = FakeStreamResponse(200, data='ping pong')
+        response = nova.virt.docker.client.Response(http_response,
+                                                    skip_body=True)
+        self.assertEqual(None, response.data)
+        self.assertEqual(None, response.json)
+        self.assertEqual('ping pong', ''.join(response.iter_chunks()))
+
+    def test_iter_chunks_reads_raw_streams_by_size(self):
+        http_response = FakeStreamResponse(200, data='ping pong')
+        response = nova.virt.docker.client.Response(http_response,
+                                                    skip_body=True)
+        self.assertEqual(['ping', ' pon', 'g'],
+                         list(response.iter_chunks(size=4)))
+
+    def test_json_stream_reads_whole_chunks(self):
+        http_response = FakeChunkedResponse(
+            200, ['{"status": "Pulling"}', '{"status": "Done"}'])
+        response = nova.virt.docker.client.Response(http_response,
+                                                    skip_body=True)
+        messages = list(nova.virt.docker.client._iter_json_stream(
+            response, size=65536))
+        self.assertEqual(['Pulling', 'Done'],
+                         [m['status'] for m in messages])
+        # NOTE: One byte to wait for the chunk, then the rest of it
+        self.assertEqual([1, 20, 1, 17, 1], http_response.reads)
+
+    def test_stats(self):
+        response = FakeResponse(200, data='{"id": "XXX"}',
+                                headers={'Content-Type': 'application/json'})
+        client = nova.virt.docker.client.DockerHTTPClient(
+            FakeConnection(response))
+        client.inspect_container('XXX')
+        stats = client.stats()
+        endpoint = stats['endpoints']['GET /containers/{id}/json']
+        self.assertEqual(1, endpoint['requests'])
+        self.assertEqual({200: 1}, endpoint['statuses'])
+        self.assertEqual(len('{"id": "XXX"}'), endpoint['bytes_in'])
+        self.assertEqual(0, stats['coalesced_requests'])
+        self.assertFalse(stats['daemon_unavailable'])
+
+    def test_stats_exclude_scheduler_wait(self):
+        response = FakeResponse(200, data='{"id": "XXX"}',
+                                headers={'Content-Type': 'application/json'})
+        response.will_close = False
+        client = nova.virt.docker.client.DockerHTTPClient()
+        self.stubs.Set(client.pool, '_create',
+                       lambda: FakeConnection(response))
+        acquire = client.scheduler.acquire
+        waiting = []
+
+        def _acquire(*args, **kwargs):
+            waiting.append(client.stats()['endpoints'])
+            return acquire(*args, **kwargs)
+
+        self.stubs.Set(client.scheduler, 'acquire', _acquire)
+        client.inspect_container('XXX')
+        # NOTE: The request is not measured while it waits for a slot
+        self.assertEqual([{}], waiting)
+        endpoint = client.stats()['endpoints']['GET /containers/{id}/json']
+        self.assertEqual(1, endpoint['requests'])
+        self.assertEqual(0, endpoint['in_flight'])
+
+
+class ResponseCacheTestCase(test.TestCase):
+
+    def setUp(self):
+        super(ResponseCacheTestCase, self).setUp()
+        self.flags(docker_api_version='1.4',
+                   docker_response_cache_size=10)
+        self.connection = FakeConnection()
+        self.client = nova.virt.docker.client.DockerHTTPClient(
+            self.connection)
+
+    def _respond(self, status, data=''):
+        self.connection._response = FakeResponse(
+            status, data=data, headers={'Content-Type': 'application/json'})
+
+    def test_inspect_container_is_cached(self):
+        self._respond(200, '{"id": "XXX"}')
+        self.assertEqual('XXX', self.client.inspect_container('XXX')['id'])
+        self.assertEqual('XXX', self.client.inspect_container('XXX')['id'])
+        self.assertEqual(1, len(self.connection.requests))
+        self.assertEqual({'hits': 1, 'misses': 1, 'size': 1},
+                         self.client.cache_stats)
+
+    def test_errors_are_not_cached(self):
+        self._respond(404)
+        self.assertEqual(None, self.client.inspect_container('XXX'))
+        self._respond(200, '{"id": "XXX"}')
+        self.assertEqual('XXX', self.client.inspect_container('XXX')['id'])
+        self.assertEqual(2, len(self.connection.requests))
+
+    def test_stop_container_invalidates(self):
+        self._respond(200, '{"id": "XXX"}')
+        self.client.inspect_container('XXX')
+        self._respond(204)
+        self.client.stop_container('XXX')
+        self._respond(200, '{"id": "XXX"}')
+        self.client.inspect_container('XXX')
+        self.assertEqual(3, len(self.connection.requests))
+
+    def test_invalidation_during_fetch(self):
+        self._respond(200, '{"id": "XXX"}')
+        getresponse = self.connection.getresponse
+
+        def _getresponse():
+            # NOTE: The container dies while it is being inspected
+            self.client.handle_event({'status': 'die', 'id': 'XXX'})
+            return getresponse()
+
+        self.stubs.Set(self.connection, 'getresponse', _getresponse)
+        self.assertEqual('XXX', self.client.inspect_container('XXX')['id'])
+        self.assertEqual(0, self.client.cache_stats['size'])
+
+    def test_pull_invalidates_images(self):
+        self._respond(200, '{"id": "YYY"}')
+        self.client.inspect_image('ubuntu')
+        self._respond(200)
+        self.client.pull_repository('ubuntu')
+        self._respond(200, '{"id": "YYY"}')
+        self.client.inspect_image('ubuntu')
+        self.assertEqual(3, len(self.connection.requests))
+
+    def test_event_invalidates(self):
+        self._respond(200, '{"id": "XXX"}')
+        self.client.inspect_container('XXX')
+        self.client.handle_event({'status': 'die', 'id': 'XXX'})
+        self.assertEqual(0, self.client.cache_stats['size'])
+
+    def test_disabled(self):
+        self.flags(docker_response_cache_size=0)
+        client = nova.virt.docker.client.DockerHTTPClient(self.connection)
+        self._respond(200, '{"id": "XXX"}')
+        client.inspect_container('XXX')
+        self._respond(200, '{"id": "XXX"}')
+        client.inspect_container('XXX')
+        self.assertEqual(2, len(self.connection.requests))
+
+
+class RetryTestCase(test.TestCase):
+
+    def setUp(self):
+        super(RetryTestCase, self).setUp()
+        self.flags(docker_api_version='1.4',
+                   docker_retry_initial_delay=0,
+                   docker_breaker_failure_threshold=3)
+        self.connection = FakeConnection(FakeResponse(
+            204, headers={'Content-Type': 'application/json'}))
+        self.errors = []
+        self.request = self.connection.request
+
+        def _request(*args, **kwargs):
+            if self.errors:
+                raise self.errors.pop(0)
+            self.request(*args, **kwargs)
+
+        self.connection.request = _request
+        self.client = nova.virt.docker.client.DockerHTTPClient(
+            self.connection)
+
+    def test_retry_connect_error(self):
+        self.errors = [socket.error(errno.ECONNREFUSED, 'Refused')]
+        self.assertTrue(self.client.stop_container('XXX'))
+        self.assertEqual(1, len(self.connection.requests))
+
+    def test_no_retry_of_sent_post(self):
+        self.errors = [socket.error(errno.ECONNRESET, 'Reset')]
+        self.assertRaises(socket.error, self.client.stop_container, 'XXX')
+
+    def test_retry_get(self):
+        self.errors = [socket.error(errno.ECONNRESET, 'Reset')]
+        self.client.inspect_container('XXX')
+        self.assertEqual(1, len(self.connection.requests))
+
+    def test_breaker_fails_fast(self):
+        self.errors = [socket.error(errno.ECONNREFUSED, 'Refused')] * 3
+        self.assertRaises(socket.error, self.client.stop_container, 'XXX')
+        self.assertTrue(self.client.breaker.is_open)
+        self.assertRaises(nova.virt.docker.retry.DaemonUnavailable,
+                          self.client.stop_container, 'XXX')
+        self.assertEqual([], self.connection.requests)
+
+
+class APIVersionTestCase(test.TestCase):
+
+    def _mock_version(self, mock_conn, data):
+        mock_conn.request('GET', '/version',
+                          headers={'Content-Type': 'application/json'})
+        response = FakeResponse(200, data=data,
+                                headers={'Content-Type': 'application/json'})
+        mock_conn.getresponse().AndReturn(response)
+
+    def test_negotiate(self):
+        mock_conn = self.mox.CreateMockAnything()
+        self._mock_version(mock_conn, '{"ApiVersion": "1.6"}')
+
+        self.mox.ReplayAll()
+
+        client = nova.virt.docker.client.DockerHTTPClient(mock_conn)
+        self.assertEqual((1, 6), client.api_version)
+        self.assertTrue(client.supports(
+            nova.virt.docker.client.NAMED_CONTAINERS))
+        self.assertFalse(client.supports(
+            nova.virt.docker.client.STATUS_FILTER))
+
+        self.mox.VerifyAll()
+
+    def test_negotiate_newer_daemon(self):
+        mock_conn = self.mox.CreateMockAnything()
+        self._mock_version(mock_conn, '{"ApiVersion": "1.99"}')
+
+        self.mox.ReplayAll()
+
+        client = nova.virt.docker.client.DockerHTTPClient(mock_conn)
+        self.assertEqual(nova.virt.docker.client.MAX_API_VERSION,
+                         client.api_version)
+
+        self.mox.VerifyAll()
+
+    def test_negotiate_old_daemon(self):
+        mock_conn = self.mox.CreateMockAnything()
+        self._mock_version(mock_conn, '{"Version": "0.6.0"}')
+
+        self.mox.ReplayAll()
+
+        client = nova.virt.docker.client.DockerHTTPClient(mock_conn)
+        self.assertEqual((1, 4), client.api_version)
+
+        self.mox.VerifyAll()
+
+    def test_configured_version(self):
+        self.flags(docker_api_version='1.6')
+        mock_conn = self.mox.CreateMockAnything()
+
+        mock_conn.request('POST', '/v1.6/containers/create?name=foo',
+                          body=mox.IgnoreArg(),
+                          headers={'Content-Type': 'application/json'})
+        response = FakeResponse(201, data='{"Id": "XXX"}',
+                                headers={'Content-Type': 'application/json'})
+        mock_conn.getresponse().AndReturn(response)
+
+        self.mox.ReplayAll()
+
+        client = nova.virt.docker.client.DockerHTTPClient(mock_conn)
+        self.assertEqual('XXX', client.create_container({}, name='foo'))
+
+        self.mox.VerifyAll()
+
+    def test_list_running_containers_filter(self):
+        self.flags(docker_api_version='1.14')
+        mock_conn = self.mox.CreateMockAnything()
+
+        url = ('/v1.14/containers/json?all=0&limit=50&filters='
+               '%7B%22status%22%3A%20%5B%22running%22%5D%7D')
+        mock_conn.request('GET', url,
+                          headers={'Content-Type': 'application/json'})
+        response = FakeResponse(200, data='[]',
+                                headers={'Content-Type': 'application/json'})
+        mock_conn.getresponse().AndReturn(response)
+
+        self.mox.ReplayAll()
+
+        client = nova.virt.docker.client.DockerHTTPClient(mock_conn)
+        self.assertEqual([], client.list_containers(_all=False))
+
+        self.mox.VerifyAll()
+
+
+class CaseInsensitiveDictTestCase(test.TestCase):
+
+    def test_loads(self):
+        obj = nova.virt.docker.client.loads(
+            '{"Id": "XXX", "State": {"Running": true}, "Ports": [{"A": 1}]}')
+        self.assertEqual(['id', 'ports', 'state'], sorted(obj.keys()))
+        self.assertEqual('XXX', obj['ID'])
+        self.assertEqual('XXX', obj.get('id'))
+        self.assertTrue(obj['state']['Running'])
+        self.assertEqual(1, obj['Ports'][0]['a'])
+        self.assertTrue('STATE' in obj)
+
+    def test_set_and_pop(self):
+        obj = nova.virt.docker.client.CaseInsensitiveDict({'Foo': 1})
+        obj['BAR'] = 2
+        self.assertEqual({'foo': 1, 'bar': 2}, obj)
+        self.assertEqual(1, obj.pop('FOO'))
+        self.assertEqual(3, obj.setdefault('Baz', 3))
+        self.assertEqual(3, obj['baz'])
+
+    def test_filter_data(self):
+        @nova.virt.docker.client.filter_data
+        def _get():
+            return [{'Id': 'XXX', 'Config': {'Hostname': 'foo'}}]
+
+        obj = _get()
+        self.assertEqual(['config', 'id'], sorted(obj[0].keys()))
+        self.assertEqual('foo', obj[0]['Config']['hostname'])
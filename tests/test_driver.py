@@ -15,10 +15,16 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import os
+
+import fixtures
+
+from nova.compute import power_state
 from nova import test
 from nova.tests import utils
 import nova.tests.virt.docker.mock_client
 from nova.tests.virt.test_virt_drivers import _VirtDriverTestCase
+from nova.virt.docker import records
 
 
 class DockerDriverTestCase(_VirtDriverTestCase, test.TestCase):
@@ -59,3 +65,156 @@ class DockerDriverTestCase(_VirtDriverTestCase, test.TestCase):
         self.connection.spawn(self.ctxt, instance_ref, image_info,
                               [], 'herp', network_info=network_info)
         return instance_ref, network_info
+
+    def test_list_instance_states(self):
+        instance_ref, network_info = self._get_running_instance()
+        states = self.connection.list_instance_states()
+        self.assertEqual({instance_ref['name']: power_state.RUNNING}, states)
+        self.connection.power_off(instance_ref)
+        states = self.connection.list_instance_states()
+        self.assertEqual({instance_ref['name']: power_state.SHUTDOWN}, states)
+
+    def test_get_info_shares_listing(self):
+        instance_ref, network_info = self._get_running_instance()
+        self.connection.get_info(instance_ref)
+        self.mox.StubOutWithMock(self.connection.docker, 'list_containers')
+        self.mox.ReplayAll()
+        info = self.connection.get_info(instance_ref)
+        self.assertEqual(power_state.RUNNING, info['state'])
+
+
+class _DockerDriverUnitTestCase(test.TestCase):
+
+    def setUp(self):
+        super(_DockerDriverUnitTestCase, self).setUp()
+        self.mock_client = nova.tests.virt.docker.mock_client.MockClient()
+        self.stubs.Set(nova.virt.docker.driver.DockerDriver,
+                       'docker', self.mock_client)
+        self.driver = nova.virt.docker.driver.DockerDriver(None)
+
+
+class DockerRegistryPortTestCase(_DockerDriverUnitTestCase):
+
+    def setUp(self):
+        super(DockerRegistryPortTestCase, self).setUp()
+        self.flags(docker_registry_default_port=5042)
+
+    def test_registry_port_is_cached(self):
+        self.assertEqual(5042, self.driver._get_registry_port())
+        self.mox.StubOutWithMock(self.mock_client, 'iter_containers')
+        self.mox.ReplayAll()
+        self.assertEqual(5042, self.driver._get_registry_port())
+        self.assertEqual({'hits': 1, 'misses': 1},
+                         self.driver.registry_port_cache_stats)
+
+    def test_registry_event_invalidates_cache(self):
+        self.driver._get_registry_port()
+        self.driver._handle_registry_event({'status': 'start', 'id': 'XXX',
+                                            'from': 'ubuntu:12.04'})
+        self.assertNotEqual(None, self.driver._registry)
+        self.driver._handle_registry_event({'status': 'start', 'id': 'YYY',
+                                            'from': 'samalba/docker-registry'})
+        self.assertEqual(None, self.driver._registry)
+
+
+class DockerImageInfoTestCase(_DockerDriverUnitTestCase):
+
+    def test_inspect_image_is_cached(self):
+        info = self.driver._inspect_image('ubuntu')
+        self.mox.StubOutWithMock(self.mock_client, 'inspect_image')
+        self.mox.ReplayAll()
+        self.assertEqual(info, self.driver._inspect_image('ubuntu'))
+
+    def test_image_event_invalidates_cache(self):
+        self.driver._inspect_image('ubuntu')
+        self.driver._handle_image_event({'status': 'untag', 'id': 'ubuntu'})
+        self.assertFalse('ubuntu' in self.driver._image_info_cache)
+
+
+class DockerNamedContainersTestCase(_DockerDriverUnitTestCase):
+
+    def test_find_container_by_name(self):
+        container_id = self.mock_client.create_container({'Hostname': 'foo'})
+        info = self.mock_client.inspect_container(container_id)
+        self.stubs.Set(self.mock_client, 'supports', lambda feature: True)
+        self.mox.StubOutWithMock(self.mock_client, 'inspect_container')
+        self.mock_client.inspect_container('foo').AndReturn(info)
+        self.mox.ReplayAll()
+        self.assertEqual(container_id,
+                         self.driver.find_container_by_name('foo').id)
+        self.mox.VerifyAll()
+
+
+class DockerWarmPoolTestCase(_DockerDriverUnitTestCase):
+
+    def setUp(self):
+        super(DockerWarmPoolTestCase, self).setUp()
+        self.flags(docker_warm_pool_size=1)
+
+    def test_disabled_without_lxc(self):
+        self.stubs.Set(self.mock_client, 'get_info',
+                       lambda: {'ExecutionDriver': 'native-0.2'})
+        self.assertFalse(self.driver.warm_pool.enabled)
+
+    def test_enabled_with_lxc(self):
+        self.stubs.Set(self.mock_client, 'get_info',
+                       lambda: {'ExecutionDriver': 'lxc-0.9.0'})
+        self.assertTrue(self.driver.warm_pool.enabled)
+
+    def test_claimed_container_does_not_start(self):
+        container_id = self.mock_client.create_container({})
+        self.stubs.Set(self.driver.warm_pool, 'claim',
+                       lambda image_name, memory, name: container_id)
+        self.stubs.Set(self.driver.warm_pool, '_save_claims', lambda: None)
+        self.driver.warm_pool.claims[container_id] = 'foo'
+        self.stubs.Set(self.mock_client, 'start_container',
+                       lambda container_id, lxc_conf=None: False)
+        self.assertEqual(None, self.driver._start_warm_container(
+            {'name': 'foo'}, 'ubuntu', 0))
+        self.assertFalse(container_id in self.mock_client._containers)
+        self.assertEqual({}, self.driver.warm_pool.claims)
+
+
+class DockerContainerIndexTestCase(_DockerDriverUnitTestCase):
+
+    def test_find_container_missed_by_trusted_index(self):
+        self.flags(docker_index_miss_resync_interval=0)
+        self.driver.container_index.resync()
+        self.driver.event_monitor.connected = True
+        container_id = self.mock_client.create_container({'Hostname': 'foo'})
+        self.assertEqual(container_id,
+                         self.driver.find_container_by_name('foo').id)
+
+    def test_miss_after_recent_resync(self):
+        self.driver.container_index.resync()
+        self.driver.event_monitor.connected = True
+        self.mox.StubOutWithMock(self.mock_client, 'iter_containers')
+        self.mox.ReplayAll()
+        self.assertEqual(None, self.driver.find_container_by_name('foo'))
+
+
+class DockerContainerPidTestCase(_DockerDriverUnitTestCase):
+
+    def test_find_container_pid(self):
+        container_id = self.mock_client.create_container({})
+        self.mock_client.start_container(container_id)
+        pid = self.mock_client._containers[container_id]['pid']
+        self.assertEqual(pid, self.driver._find_container_pid(container_id))
+
+    def test_find_container_pid_inspects_again(self):
+        container_id = self.mock_client.create_container({})
+        info = records.ContainerInfo.from_inspect(
+            self.mock_client.inspect_container(container_id))
+        self.mock_client.start_container(container_id)
+        pid = self.mock_client._containers[container_id]['pid']
+        self.assertEqual(pid,
+                         self.driver._find_container_pid(container_id, info))
+
+    def test_find_container_pid_from_cgroup(self):
+        tasks_path = self.useFixture(fixtures.TempDir()).path
+        os.makedirs(os.path.join(tasks_path, 'lxc', 'XXX'))
+        with open(os.path.join(tasks_path, 'lxc', 'XXX', 'tasks'), 'w') as f:
+            f.write('4242\n')
+        self.driver._cgroup_devices_path = tasks_path
+        info = records.ContainerInfo('XXX', pid=0)
+        self.assertEqual(4242, self.driver._find_container_pid('XXX', info))
@@ -0,0 +1,112 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (c) 2013 dotCloud, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from nova import test
+from nova.virt.docker import hostinfo
+from nova.virt.docker import imagecache
+
+
+class FakeDocker(object):
+    def __init__(self, images, containers):
+        self.images = images
+        self.containers = containers
+        self.deleted = []
+
+    def list_images(self):
+        return self.images
+
+    def iter_containers(self, _all=True):
+        return iter(self.containers)
+
+    def delete_image(self, image_name):
+        self.deleted.append(image_name)
+        return True
+
+
+class ImageCacheManagerTestCase(test.TestCase):
+
+    def setUp(self):
+        super(ImageCacheManagerTestCase, self).setUp()
+        self.available = 5
+        self.stubs.Set(hostinfo, 'get_disk_usage', self.get_disk_usage)
+        self.flags(docker_image_cache_min_free_percent=10,
+                   docker_image_cache_target_free_percent=20)
+        images = [
+            {'Repository': 'used', 'Tag': 'latest', 'id': 'aaa',
+             'Created': 1, 'Size': 10},
+            {'Repository': 'old', 'Tag': 'latest', 'id': 'bbb',
+             'Created': 2, 'Size': 10},
+            {'Repository': 'recent', 'Tag': 'latest', 'id': 'ccc',
+             'Created': 3, 'Size': 10},
+        ]
+        containers = [{'Image': 'used', 'id': 'XXX'}]
+        self.docker = FakeDocker(images, containers)
+        self.manager = imagecache.ImageCacheManager(self.docker)
+
+    def get_disk_usage(self):
+        available = self.available + 10 * len(self.docker.deleted)
+        return {'total': 100, 'available': available,
+                'used': 100 - available}
+
+    def test_enough_space(self):
+        self.available = 50
+        self.assertEqual(0, self.manager.manage())
+        self.assertEqual([], self.docker.deleted)
+
+    def test_evict_least_recently_used(self):
+        self.manager.record_use('old:latest', when=20)
+        self.manager.record_use('recent:latest', when=10)
+        self.assertEqual(20, self.manager.manage())
+        self.assertEqual(['recent:latest', 'old:latest'], self.docker.deleted)
+
+    def test_record_use_of_untagged_name(self):
+        self.docker.images.append(
+            {'Repository': '10.0.0.1:5042/new', 'Tag': 'latest',
+             'id': 'ddd', 'Created': 4, 'Size': 10})
+        self.manager.record_use('old', when=20)
+        self.manager.record_use('recent', when=30)
+        self.manager.record_use('10.0.0.1:5042/new', when=10)
+        self.assertEqual(20, self.manager.manage())
+        self.assertEqual(['10.0.0.1:5042/new:latest', 'old:latest'],
+                         self.docker.deleted)
+
+    def test_evicted_recently(self):
+        self.manager.record_use('old', when=20)
+        self.manager.record_use('recent', when=10)
+        self.manager.manage()
+        self.assertTrue(self.manager.evicted_recently('old', 60))
+        self.assertFalse(self.manager.evicted_recently('used', 60))
+        self.manager.record_use('old')
+        self.assertFalse(self.manager.evicted_recently('old', 60))
+
+    def test_evict_until_target(self):
+        self.flags(docker_image_cache_min_free_percent=15)
+        self.available = 12
+        self.assertEqual(10, self.manager.manage())
+        self.assertEqual(['old:latest'], self.docker.deleted)
+
+    def test_list_images_with_repo_tags(self):
+        self.docker.images = [
+            {'RepoTags': ['used:latest'], 'id': 'aaa', 'Created': 1},
+            {'RepoTags': ['old:latest', 'old:1.0'], 'id': 'bbb',
+             'Created': 2},
+            {'RepoTags': ['<none>:<none>'], 'id': 'ccc', 'Created': 3},
+        ]
+        self.manager.record_use('old:1.0', when=20)
+        self.assertEqual(30, self.manager.manage())
+        self.assertEqual(['ccc', 'old:latest', 'old:1.0'],
+                         self.docker.deleted)
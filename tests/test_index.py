@@ -0,0 +1,81 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (c) 2013 dotCloud, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from nova import test
+import nova.tests.virt.docker.mock_client
+from nova.virt.docker import index
+
+
+class FakeMonitor(object):
+    def __init__(self):
+        self.connected = True
+
+    def add_listener(self, callback, resync=None):
+        pass
+
+
+class ContainerIndexTestCase(test.TestCase):
+
+    def setUp(self):
+        super(ContainerIndexTestCase, self).setUp()
+        self.docker = nova.tests.virt.docker.mock_client.MockClient()
+        self.monitor = FakeMonitor()
+        self.index = index.ContainerIndex(self.docker, self.monitor)
+
+    def test_find(self):
+        container_id = self.docker.create_container({'Hostname': 'foo'})
+        entry = self.index.find('foo')
+        self.assertEqual(container_id, entry.id)
+        self.assertEqual('foo', entry.hostname)
+        self.assertFalse(entry.running)
+        self.assertEqual(None, self.index.find('bar'))
+
+    def test_find_trusts_index_while_following_events(self):
+        self.index.resync()
+        self.docker.create_container({'Hostname': 'foo'})
+        self.assertEqual(None, self.index.find('foo'))
+        self.monitor.connected = False
+        self.assertNotEqual(None, self.index.find('foo'))
+
+    def test_handle_events(self):
+        self.index.resync()
+        container_id = self.docker.create_container({'Hostname': 'foo'})
+        self.index.handle_event({'status': 'create', 'id': container_id})
+        self.assertFalse(self.index.find('foo').running)
+        self.index.handle_event({'status': 'start',
+                                 'id': container_id[:12]})
+        self.assertTrue(self.index.find('foo').running)
+        self.index.handle_event({'status': 'destroy', 'id': container_id})
+        self.assertEqual(None, self.index.find('foo'))
+
+    def test_changes_during_resync_are_kept(self):
+        self.index.resync()
+        foo_id = self.docker.create_container({'Hostname': 'foo'})
+        iter_inspect = self.docker.iter_inspect_containers
+
+        def _iter_inspect(container_ids, concurrency=None):
+            # NOTE: Spawned and destroyed while the listed containers are
+            # being inspected
+            bar_id = self.docker.create_container({'Hostname': 'bar'})
+            self.index.add(bar_id, 'bar')
+            self.index.remove(foo_id)
+            return iter_inspect(container_ids, concurrency)
+
+        self.stubs.Set(self.docker, 'iter_inspect_containers', _iter_inspect)
+        self.index.resync()
+        self.assertNotEqual(None, self.index.find('bar'))
+        self.assertEqual(None, self.index.find('foo'))
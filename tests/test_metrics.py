@@ -0,0 +1,89 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (c) 2013 dotCloud, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from nova import test
+from nova.virt.docker import metrics
+
+
+class FakeSink(object):
+    def __init__(self):
+        self.records = []
+
+    def record(self, metrics, request, status, duration):
+        self.records.append((request.method, request.path, status))
+
+
+class TemplatePathTestCase(test.TestCase):
+
+    def test_template_path(self):
+        for url, path in (
+                ('/v1.4/containers/ps?all=1', '/containers/ps'),
+                ('/v1.6/containers/json', '/containers/json'),
+                ('/v1.4/containers/create', '/containers/create'),
+                ('/v1.4/containers/abc123/json', '/containers/{id}/json'),
+                ('/v1.4/containers/abc123', '/containers/{id}'),
+                ('/v1.4/images/json?all=0', '/images/json'),
+                ('/v1.4/images/create?fromImage=ubuntu', '/images/create'),
+                ('/v1.4/images/10.0.0.1:5042/ubuntu/push',
+                 '/images/{name}/push'),
+                ('/v1.4/images/samalba/busybox/json', '/images/{name}/json'),
+                ('/v1.4/images/ubuntu', '/images/{name}'),
+                ('/version', '/version')):
+            self.assertEqual(path, metrics.template_path(url))
+
+
+class HistogramTestCase(test.TestCase):
+
+    def test_percentile(self):
+        histogram = metrics.Histogram()
+        self.assertEqual(0, histogram.percentile(50))
+        for value in (0.5, 3, 4, 40, 20000):
+            histogram.add(value)
+        self.assertEqual(5, histogram.percentile(50))
+        self.assertEqual(20000, histogram.percentile(99))
+        self.assertEqual(5, histogram.count)
+
+
+class MetricsTestCase(test.TestCase):
+
+    def test_snapshot(self):
+        sink = FakeSink()
+        collector = metrics.Metrics(sinks=[sink])
+        request = collector.start('POST', '/v1.4/containers/create', 42)
+        self.assertEqual(
+            1, collector.snapshot()['POST /containers/create']['in_flight'])
+        request.finish(201, 10)
+        request = collector.start('GET', '/v1.4/containers/abc/json')
+        request.fail(IOError())
+        snapshot = collector.snapshot()
+        create = snapshot['POST /containers/create']
+        self.assertEqual(1, create['requests'])
+        self.assertEqual(0, create['in_flight'])
+        self.assertEqual({201: 1}, create['statuses'])
+        self.assertEqual(42, create['bytes_out'])
+        self.assertEqual(10, create['bytes_in'])
+        self.assertEqual(1, snapshot['GET /containers/{id}/json']['errors'])
+        self.assertEqual([('POST', '/containers/create', 201),
+                          ('GET', '/containers/{id}/json', None)],
+                         sink.records)
+
+    def test_statsd_name(self):
+        sink = metrics.StatsdSink(prefix='docker')
+        request = metrics.Metrics(sinks=[]).start(
+            'GET', '/v1.4/containers/abc/json')
+        self.assertEqual('docker.get.containers_id_json',
+                         sink._name(request))
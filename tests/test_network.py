@@ -0,0 +1,196 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (c) 2013 dotCloud, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+
+import eventlet
+import fixtures
+
+from nova import exception
+from nova import test
+from nova import utils
+from nova.virt.docker import network
+
+
+class NetworkBackendTestCase(test.TestCase):
+
+    def setUp(self):
+        super(NetworkBackendTestCase, self).setUp()
+        self.commands = []
+        self.stubs.Set(utils, 'execute', self.fake_execute)
+
+    def fake_execute(self, *cmd, **kwargs):
+        self.commands.append((cmd, kwargs.get('process_input')))
+        return '', ''
+
+    def test_execute_backend(self):
+        backend = network.ExecuteBackend()
+        backend.plug('pvnetl1', 'pvnetr1', 'br100', 42, 'XXX', '10.0.0.2',
+                     utils.UndoManager())
+        self.assertEqual(5, len(self.commands))
+        self.assertEqual(('brctl', 'addif', 'br100', 'pvnetl1'),
+                         self.commands[1][0])
+
+    def test_batch_backend(self):
+        backend = network.IPBatchBackend()
+        backend.plug('pvnetl1', 'pvnetr1', 'br100', 42, 'XXX', '10.0.0.2',
+                     utils.UndoManager())
+        self.assertEqual(2, len(self.commands))
+        self.assertEqual(('ip', '-batch', '-'), self.commands[0][0])
+        self.assertEqual('link add name pvnetl1 type veth peer name pvnetr1\n'
+                         'link set pvnetl1 master br100\n'
+                         'link set pvnetl1 up\n'
+                         'link set pvnetr1 netns 42\n',
+                         self.commands[0][1])
+        self.assertEqual(('ip', 'netns', 'exec', 'XXX', 'ifconfig',
+                          'pvnetr1', '10.0.0.2'), self.commands[1][0])
+
+    def test_batch_backend_rollback(self):
+        def fake_execute(*cmd, **kwargs):
+            self.commands.append((cmd, kwargs.get('process_input')))
+            if cmd[1] == '-batch':
+                raise RuntimeError()
+            return '', ''
+
+        self.stubs.Set(utils, 'execute', fake_execute)
+        undo_mgr = utils.UndoManager()
+        backend = network.IPBatchBackend()
+        self.assertRaises(RuntimeError, backend.plug, 'pvnetl1', 'pvnetr1',
+                          'br100', 42, 'XXX', '10.0.0.2', undo_mgr)
+        undo_mgr._rollback()
+        self.assertEqual(('ip', 'link', 'delete', 'pvnetl1'),
+                         self.commands[-1][0])
+
+    def test_get_backend(self):
+        self.flags(docker_network_backend='batch')
+        self.assertTrue(isinstance(network.get_backend(),
+                                   network.IPBatchBackend))
+        self.flags(docker_network_backend='foo')
+        self.assertRaises(exception.NovaException, network.get_backend)
+
+
+class FakeBackend(object):
+    def __init__(self):
+        self.created = []
+        self.deleted = []
+
+    def create_veth(self, if_local_name, if_remote_name, bridge):
+        self.created.append((if_local_name, if_remote_name, bridge))
+
+    def delete_veth(self, if_local_name):
+        self.deleted.append(if_local_name)
+
+
+class VethPoolTestCase(test.TestCase):
+
+    def setUp(self):
+        super(VethPoolTestCase, self).setUp()
+        self.stubs.Set(eventlet, 'spawn_n', lambda f, *args: f(*args))
+        self.backend = FakeBackend()
+
+    def test_claim(self):
+        pool = network.VethPool(self.backend, size=2)
+        self.assertEqual(None, pool.claim('br100'))
+        self.assertEqual(2, len(self.backend.created))
+        if_local_name, if_remote_name = pool.claim('br100')
+        self.assertTrue(if_local_name.startswith('pvpooll'))
+        self.assertTrue(len(if_local_name) <= 15)
+        self.assertEqual(if_local_name[7:], if_remote_name[7:])
+        self.assertEqual(3, len(self.backend.created))
+        self.assertEqual(2, len(pool.names()))
+
+    def test_disabled(self):
+        pool = network.VethPool(self.backend, size=0)
+        self.assertEqual(None, pool.claim('br100'))
+        self.assertEqual([], self.backend.created)
+
+    def test_drain(self):
+        pool = network.VethPool(self.backend, size=2)
+        pool.fill('br100')
+        pool.drain()
+        self.assertEqual(2, len(self.backend.deleted))
+        self.assertEqual(set(), pool.names())
+
+
+class GarbageCollectorTestCase(test.TestCase):
+
+    def setUp(self):
+        super(GarbageCollectorTestCase, self).setUp()
+        self.netns_path = self.useFixture(fixtures.TempDir()).path
+        self.sys_net_path = self.useFixture(fixtures.TempDir()).path
+        self.stubs.Set(network, 'NETNS_PATH', self.netns_path)
+        self.stubs.Set(network, 'SYS_NET_PATH', self.sys_net_path)
+        self.removed_links = []
+        self.stubs.Set(network, 'remove_netns_link',
+                       self.removed_links.append)
+        self.backend = FakeBackend()
+        self.live_id = 'a' * 64
+        self.dead_id = 'b' * 64
+
+    def _touch(self, path, name):
+        open(os.path.join(path, name), 'w').close()
+
+    def test_veth_names(self):
+        self.assertEqual(('pvnetlaaaaaaaaa', 'pvnetraaaaaaaaa'),
+                         network.veth_names(self.live_id))
+
+    def test_collect(self):
+        for container_id in (self.live_id, self.dead_id, 'qrouter-XXX'):
+            self._touch(self.netns_path, container_id)
+        for name in ('eth0',
+                     network.veth_names(self.live_id)[0],
+                     network.veth_names(self.dead_id)[0],
+                     'pvnetl42', 'pvnetr42',
+                     'pvnetl43',
+                     'pvpoolldeadbeef', 'pvpoolrdeadbeef'):
+            self._touch(self.sys_net_path, name)
+        gc = network.GarbageCollector(self.backend)
+        removed = gc.collect(lambda: [self.live_id])
+        self.assertEqual(4, removed)
+        self.assertEqual([self.dead_id], self.removed_links)
+        self.assertEqual(set([network.veth_names(self.dead_id)[0],
+                              'pvnetl42', 'pvpoolldeadbeef']),
+                         set(self.backend.deleted))
+
+    def test_collect_nothing_without_containers(self):
+        self._touch(self.netns_path, self.dead_id)
+        self._touch(self.sys_net_path, network.veth_names(self.dead_id)[0])
+        gc = network.GarbageCollector(self.backend)
+        self.assertEqual(0, gc.collect(lambda: []))
+        self.assertEqual([], self.removed_links)
+        self.assertEqual([], self.backend.deleted)
+
+    def test_collect_aborts_on_failed_listing(self):
+        self._touch(self.netns_path, self.dead_id)
+
+        def _list_container_ids():
+            raise exception.NovaException('Docker daemon answered 500')
+
+        gc = network.GarbageCollector(self.backend)
+        self.assertRaises(exception.NovaException, gc.collect,
+                          _list_container_ids)
+        self.assertEqual([], self.removed_links)
+
+    def test_collect_skips_pooled_interfaces(self):
+        self.stubs.Set(eventlet, 'spawn_n', lambda f, *args: f(*args))
+        pool = network.VethPool(self.backend, size=1)
+        pool.fill('br100')
+        if_local_name, if_remote_name = self.backend.created[0][:2]
+        self._touch(self.sys_net_path, if_local_name)
+        self._touch(self.sys_net_path, if_remote_name)
+        gc = network.GarbageCollector(self.backend, pool)
+        self.assertEqual(0, gc.collect(lambda: []))
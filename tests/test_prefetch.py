@@ -0,0 +1,93 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (c) 2013 dotCloud, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from nova import test
+from nova.virt.docker import hostinfo
+from nova.virt.docker import prefetch
+
+
+class FakeDocker(object):
+    def __init__(self):
+        self.pulled = []
+
+    def pull_repository(self, name):
+        self.pulled.append(name)
+        return True
+
+
+class FakeTime(object):
+    def __init__(self, now):
+        self._now = now
+
+    def time(self):
+        return self._now[0]
+
+
+class ImagePrefetcherTestCase(test.TestCase):
+
+    def setUp(self):
+        super(ImagePrefetcherTestCase, self).setUp()
+        self.available = 50
+        self.stubs.Set(hostinfo, 'get_disk_usage', self.get_disk_usage)
+        self.flags(docker_prefetch_images=['ubuntu'],
+                   docker_prefetch_top_images=2,
+                   docker_prefetch_max_pulls=1,
+                   docker_image_cache_target_free_percent=20)
+        self.docker = FakeDocker()
+        self.prefetcher = prefetch.ImagePrefetcher(
+            self.docker, lambda name: 'registry/' + name,
+            lambda name: name in self.docker.pulled)
+
+    def get_disk_usage(self):
+        return {'total': 100, 'available': self.available,
+                'used': 100 - self.available}
+
+    def test_run(self):
+        self.prefetcher.record_launch('registry/busybox')
+        self.assertEqual(['registry/ubuntu'], self.prefetcher.run())
+        self.assertEqual(['registry/busybox'], self.prefetcher.run())
+        self.assertEqual([], self.prefetcher.run())
+        self.assertEqual(['registry/busybox', 'registry/ubuntu'],
+                         self.prefetcher.warm_images())
+
+    def test_launches_decay(self):
+        self.flags(docker_prefetch_images=[], docker_prefetch_top_images=1)
+        now = [0]
+        self.stubs.Set(prefetch, 'time', FakeTime(now))
+        prefetcher = prefetch.ImagePrefetcher(
+            self.docker, lambda name: name, lambda name: False)
+        for _i in range(4):
+            prefetcher.record_launch('old')
+        now[0] = 3 * 3600
+        prefetcher.record_launch('new')
+        self.assertEqual(['new'], prefetcher.run())
+
+    def test_skip_recently_evicted(self):
+        evicted = []
+        prefetcher = prefetch.ImagePrefetcher(
+            self.docker, lambda name: 'registry/' + name,
+            lambda name: name in self.docker.pulled,
+            lambda name, period: period == 3600 and name in evicted)
+        evicted.append('registry/ubuntu')
+        prefetcher.record_launch('registry/busybox')
+        self.assertEqual(['registry/busybox'], prefetcher.run())
+        self.assertEqual([], prefetcher.run())
+
+    def test_run_without_free_space(self):
+        self.available = 10
+        self.assertEqual([], self.prefetcher.run())
+        self.assertEqual([], self.docker.pulled)
@@ -0,0 +1,58 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (c) 2013 dotCloud, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from nova import test
+from nova.virt.docker import progress
+
+
+class ProgressTrackerTestCase(test.TestCase):
+
+    def test_progress_detail(self):
+        tracker = progress.ProgressTracker(interval=0)
+        tracker.update({'status': 'Downloading', 'id': 'aaa',
+                        'progressDetail': {'current': 100, 'total': 300}})
+        tracker.update({'status': 'Downloading', 'id': 'bbb',
+                        'progressDetail': {'current': 50, 'total': 50}})
+        tracker.update({'status': 'Downloading', 'id': 'aaa',
+                        'progressDetail': {'current': 200, 'total': 300}})
+        self.assertEqual(250, tracker.bytes)
+        self.assertEqual(2, len(tracker.layers))
+        self.assertEqual('Downloading', tracker.status)
+        self.assertEqual(None, tracker.error)
+
+    def test_progress_string(self):
+        tracker = progress.ProgressTracker(interval=0)
+        tracker.update({'status': 'Downloading', 'id': 'aaa',
+                        'progress': '[==>   ] 1.5 MB/3 MB 2s'})
+        self.assertEqual({'aaa': (1500000, 3000000)}, tracker.layers)
+
+    def test_error(self):
+        tracker = progress.ProgressTracker()
+        tracker.update({'error': 'Oops',
+                        'errorDetail': {'message': 'Server error: 500'}})
+        self.assertEqual('Server error: 500', tracker.error)
+
+    def test_callback(self):
+        reports = []
+        tracker = progress.ProgressTracker(reports.append, interval=3600)
+        for current in (10, 20):
+            tracker.update({'id': 'aaa',
+                            'progressDetail': {'current': current}})
+        self.assertEqual(1, len(reports))
+        tracker.finish()
+        self.assertEqual(2, len(reports))
+        self.assertEqual(20, reports[-1].bytes)
@@ -0,0 +1,68 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (c) 2013 dotCloud, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from nova import test
+import nova.tests.virt.docker.mock_client
+from nova.virt.docker import records
+
+
+class ContainerInfoTestCase(test.TestCase):
+
+    def test_from_inspect(self):
+        docker = nova.tests.virt.docker.mock_client.MockClient()
+        container_id = docker.create_container({'Hostname': 'foo',
+                                                'Image': 'ubuntu',
+                                                'Memory': 512})
+        docker.start_container(container_id)
+        info = records.ContainerInfo.from_inspect(
+            docker.inspect_container(container_id))
+        self.assertEqual(container_id, info.id)
+        self.assertEqual('foo', info.hostname)
+        self.assertEqual('ubuntu', info.image)
+        self.assertEqual(512, info.memory)
+        self.assertTrue(info.running)
+        self.assertEqual(docker._containers[container_id]['pid'], info.pid)
+        self.assertEqual('bash', info.path)
+
+    def test_from_inspect_ports(self):
+        info = records.ContainerInfo.from_inspect({
+            'id': 'XXX',
+            'NetworkSettings': {
+                'Ports': {
+                    '5000/tcp': [{'HostIp': '0.0.0.0', 'HostPort': '49153'}],
+                    '53/udp': None,
+                },
+            },
+        })
+        self.assertEqual({'Tcp': {'5000': '49153'}, 'Udp': {}},
+                         info.port_mapping)
+
+    def test_from_inspect_no_result(self):
+        self.assertEqual(None, records.ContainerInfo.from_inspect(None))
+
+    def test_slots(self):
+        info = records.ContainerInfo('XXX')
+        self.assertRaises(AttributeError, setattr, info, 'foo', 'bar')
+
+
+class ImageInfoTestCase(test.TestCase):
+
+    def test_from_inspect(self):
+        info = records.ImageInfo.from_inspect(
+            {'id': 'XXX', 'container_config': {'Cmd': ['sh']}})
+        self.assertEqual('XXX', info.id)
+        self.assertEqual(['sh'], info.cmd)
@@ -0,0 +1,85 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (c) 2013 dotCloud, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import errno
+import socket
+import time
+
+from nova import test
+from nova.virt.docker import retry
+
+
+class BackoffDelayTestCase(test.TestCase):
+
+    def test_backoff_delay(self):
+        for attempt in range(10):
+            delay = retry.backoff_delay(attempt, initial_delay=0.5,
+                                        max_delay=3)
+            self.assertTrue(0 <= delay <= min(3, 0.5 * 2 ** attempt))
+
+    def test_is_connect_error(self):
+        self.assertTrue(retry.is_connect_error(
+            socket.error(errno.ECONNREFUSED, 'Connection refused')))
+        self.assertFalse(retry.is_connect_error(
+            socket.error(errno.ECONNRESET, 'Connection reset')))
+        self.assertFalse(retry.is_connect_error(
+            retry.DaemonUnavailable(errno.ECONNREFUSED, 'Down')))
+
+
+class CircuitBreakerTestCase(test.TestCase):
+
+    def setUp(self):
+        super(CircuitBreakerTestCase, self).setUp()
+        self.probes = []
+        self.daemon_up = False
+        self.now = time.time()
+        self.stubs.Set(time, 'time', lambda: self.now)
+        self.breaker = retry.CircuitBreaker(self._probe, threshold=2,
+                                            reset_timeout=10)
+
+    def _probe(self):
+        self.probes.append(None)
+        if not self.daemon_up:
+            raise socket.error(errno.ECONNREFUSED, 'Connection refused')
+
+    def test_opens_after_threshold(self):
+        self.breaker.record_failure()
+        self.breaker.check()
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.is_open)
+        self.assertRaises(retry.DaemonUnavailable, self.breaker.check)
+        self.assertEqual([], self.probes)
+
+    def test_success_resets_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertFalse(self.breaker.is_open)
+
+    def test_probe_after_reset_timeout(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.now += 10
+        self.assertRaises(retry.DaemonUnavailable, self.breaker.check)
+        self.assertEqual(1, len(self.probes))
+        self.assertRaises(retry.DaemonUnavailable, self.breaker.check)
+        self.assertEqual(1, len(self.probes))
+        self.now += 10
+        self.daemon_up = True
+        self.breaker.check()
+        self.assertFalse(self.breaker.is_open)
+        self.assertEqual(2, len(self.probes))
@@ -0,0 +1,78 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (c) 2013 dotCloud, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet
+
+from nova import test
+from nova.virt.docker import scheduler
+
+
+class RequestSchedulerTestCase(test.TestCase):
+
+    def _make_scheduler(self, max_active=2, background=1):
+        return scheduler.RequestScheduler(
+            max_active, limits={scheduler.INTERACTIVE: max_active,
+                                scheduler.BACKGROUND: background})
+
+    def test_background_limit(self):
+        requests = self._make_scheduler()
+        requests.acquire(scheduler.BACKGROUND)
+        order = []
+
+        def _request(priority):
+            requests.acquire(priority)
+            order.append(priority)
+
+        thread = eventlet.spawn(_request, scheduler.BACKGROUND)
+        eventlet.sleep(0)
+        self.assertEqual([], order)
+        requests.acquire(scheduler.INTERACTIVE)
+        requests.release(scheduler.BACKGROUND)
+        thread.wait()
+        self.assertEqual([scheduler.BACKGROUND], order)
+        self.assertEqual(1, requests.stats[scheduler.BACKGROUND]['queued'])
+        self.assertEqual(0, requests.stats[scheduler.INTERACTIVE]['queued'])
+
+    def test_interactive_first(self):
+        requests = self._make_scheduler(max_active=1)
+        requests.acquire(scheduler.INTERACTIVE)
+        order = []
+
+        def _request(priority):
+            with requests.request(priority):
+                order.append(priority)
+
+        threads = [eventlet.spawn(_request, scheduler.BACKGROUND),
+                   eventlet.spawn(_request, scheduler.INTERACTIVE)]
+        eventlet.sleep(0)
+        requests.release(scheduler.INTERACTIVE)
+        for thread in threads:
+            thread.wait()
+        self.assertEqual([scheduler.INTERACTIVE, scheduler.BACKGROUND],
+                         order)
+
+    def test_priority_context(self):
+        self.assertEqual(scheduler.INTERACTIVE,
+                         scheduler.current_priority())
+
+        @scheduler.background
+        def _inventory():
+            return scheduler.current_priority()
+
+        self.assertEqual(scheduler.BACKGROUND, _inventory())
+        self.assertEqual(scheduler.INTERACTIVE,
+                         scheduler.current_priority())
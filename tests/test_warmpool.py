@@ -0,0 +1,103 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (c) 2013 dotCloud, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+
+import eventlet
+import fixtures
+
+from nova import test
+import nova.tests.virt.docker.mock_client
+from nova.virt.docker import records
+from nova.virt.docker import warmpool
+
+
+class WarmPoolTestCase(test.TestCase):
+
+    def setUp(self):
+        super(WarmPoolTestCase, self).setUp()
+        self.stubs.Set(eventlet, 'spawn_n', lambda f, *args: f(*args))
+        self.docker = nova.tests.virt.docker.mock_client.MockClient()
+        self.claims_file = os.path.join(
+            self.useFixture(fixtures.TempDir()).path, 'claims.json')
+
+    def _make_args(self, image_name, memory):
+        return {'Image': image_name, 'Memory': memory}
+
+    def _make_pool(self, size=2):
+        return warmpool.WarmPool(self.docker, self._make_args, size=size,
+                                 max_images=1, claims_file=self.claims_file)
+
+    def test_claim(self):
+        pool = self._make_pool()
+        self.assertEqual(None, pool.claim('ubuntu', 512, 'foo'))
+        pool.record_launch('ubuntu', 512)
+        self.assertEqual(2, len(self.docker._containers))
+        container_id = pool.claim('ubuntu', 512, 'foo')
+        self.assertTrue(container_id in self.docker._containers)
+        self.assertEqual(3, len(self.docker._containers))
+        self.assertEqual({container_id: 'foo'}, pool.claims)
+        self.assertEqual({container_id: 'foo'}, self._make_pool().claims)
+        pool.forget(container_id)
+        self.assertEqual({}, self._make_pool().claims)
+
+    def test_only_most_launched_images_are_warm(self):
+        pool = self._make_pool()
+        pool.record_launch('ubuntu', 512)
+        pool.record_launch('ubuntu', 512)
+        pool.record_launch('busybox', 512)
+        self.assertEqual(None, pool.claim('busybox', 512, 'foo'))
+
+    def test_disabled(self):
+        pool = self._make_pool(size=0)
+        pool.record_launch('ubuntu', 512)
+        self.assertEqual({}, self.docker._containers)
+
+    def test_adopt(self):
+        pool = self._make_pool()
+        pool.record_launch('ubuntu', 512)
+        infos = self.docker.inspect_containers(self.docker._containers)
+        adopted = self._make_pool()
+        adopted.adopt(records.ContainerInfo.from_inspect(info)
+                      for info in infos.values())
+        self.assertNotEqual(None, adopted.claim('ubuntu', 512, 'foo'))
+
+    def test_adopt_skips_running_containers(self):
+        pool = self._make_pool(size=1)
+        pool.record_launch('ubuntu', 512)
+        container_id = self.docker._containers.keys()[0]
+        self.docker.start_container(container_id)
+        adopted = self._make_pool()
+        adopted.adopt([records.ContainerInfo.from_inspect(
+            self.docker.inspect_container(container_id))])
+        self.assertEqual(None, adopted.claim('ubuntu', 512, 'foo'))
+
+    def test_adopt_nothing_without_claims(self):
+        pool = self._make_pool()
+        pool.record_launch('ubuntu', 512)
+        with open(self.claims_file, 'w') as f:
+            f.write('{')
+        infos = self.docker.inspect_containers(self.docker._containers)
+        adopted = self._make_pool()
+        adopted.adopt(records.ContainerInfo.from_inspect(info)
+                      for info in infos.values())
+        self.assertEqual(None, adopted.claim('ubuntu', 512, 'foo'))
+
+    def test_is_warm_name(self):
+        self.assertTrue(warmpool.is_warm_name('docker-warm-0123456789ab'))
+        self.assertFalse(warmpool.is_warm_name('instance-00000001'))
+        self.assertFalse(warmpool.is_warm_name(None))
@@ -0,0 +1,118 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (c) 2013 dotCloud, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compares the decoding of a container inspect result by the docker client
+   with the former filter_data, which kept a lowercase copy of every key.
+
+Usage: python tools/bench_decode.py [iterations]
+"""
+
+import json
+import sys
+import timeit
+
+from nova.virt.docker import client
+
+
+INSPECT = json.dumps({
+    'ID': 'f' * 64,
+    'Created': '2013-10-01T12:00:00.000000000Z',
+    'Path': '/usr/sbin/sshd',
+    'Args': ['-D'],
+    'Config': {
+        'Hostname': 'instance-00000001',
+        'User': '',
+        'Memory': 536870912,
+        'MemorySwap': 0,
+        'CpuShares': 0,
+        'AttachStdin': False,
+        'AttachStdout': False,
+        'AttachStderr': False,
+        'PortSpecs': None,
+        'Tty': True,
+        'OpenStdin': True,
+        'StdinOnce': False,
+        'Env': ['HOME=/', 'PATH=/usr/local/bin:/usr/bin:/bin'],
+        'Cmd': ['/usr/sbin/sshd', '-D'],
+        'Dns': None,
+        'Image': 'ubuntu:12.04',
+        'Volumes': {},
+        'VolumesFrom': '',
+        'Entrypoint': None,
+    },
+    'State': {
+        'Running': True,
+        'Pid': 4242,
+        'ExitCode': 0,
+        'StartedAt': '2013-10-01T12:00:01.000000000Z',
+        'Ghost': False,
+    },
+    'Image': 'e' * 64,
+    'NetworkSettings': {
+        'IPAddress': '',
+        'IPPrefixLen': 0,
+        'Gateway': '',
+        'Bridge': '',
+        'PortMapping': None,
+    },
+    'SysInitPath': '/usr/bin/docker',
+    'ResolvConfPath': '/etc/resolv.conf',
+    'Volumes': {},
+})
+
+
+def _legacy_filter(obj):
+    if isinstance(obj, list):
+        obj = [_legacy_filter(o) for o in obj]
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            if isinstance(k, basestring):
+                obj[k.lower()] = _legacy_filter(v)
+    return obj
+
+
+def legacy_decode():
+    return _legacy_filter(json.loads(INSPECT))
+
+
+def decode():
+    return client.loads(INSPECT)
+
+
+def deep_size(obj):
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for k, v in obj.iteritems():
+            size += sys.getsizeof(k) + deep_size(v)
+    elif isinstance(obj, list):
+        size += sum(deep_size(o) for o in obj)
+    else:
+        return size
+    return size
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    for name, func in (('legacy filter_data', legacy_decode),
+                       ('CaseInsensitiveDict', decode)):
+        seconds = timeit.timeit(func, number=iterations)
+        print('{0:20} {1:8.1f} us/decode {2:6} bytes/result'.format(
+            name, seconds * 1000000 / iterations, deep_size(func())))
+
+
+if __name__ == '__main__':
+    main()